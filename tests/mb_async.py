@@ -0,0 +1,233 @@
+# MIT License
+
+# Copyright (c) 2021 Vasily Denisenko, Sergey Kuznetsov
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Asyncio layer over mb_bsp/mb_util for several test environments (buses)
+# driven concurrently from one process. Every bus has its own copy of the
+# mb_bsp backend module, selected by MB_BSP_INSTANCE, and its own CS
+# registers shadow. Backend calls block, so every bus runs them, status
+# waits included, in its own worker thread: accesses and waits of all
+# buses overlap. Every bus has its own timeouts: derived from its
+# configuration or fixed by Bus.timeout.
+#
+# Usage (check of concurrent 0x10/0x03 transactions):
+#	MB_BSP_BACKEND=model python3 mb_async.py [buses] [transactions per bus]
+
+
+
+import asyncio
+import concurrent.futures
+import functools
+import importlib.util
+import mb_bsp
+import mb_util
+import os
+import sys
+import time
+from random import randrange
+
+
+
+BSP_MODULES = {	'hardware': 	'mb_bsp',
+				'model': 		'mb_bsp_model',
+				'mmap': 		'mb_bsp_mmap'	}
+
+
+
+def load_bsp(instance):
+	# Separate copy of the backend module, connected to the test environment
+	# instance: the hardware template reads MB_BSP_INSTANCE environment
+	# variable, other backends take mb_bsp.MB_BSP_INSTANCE. Buses are polled
+	# in wall time, so model copies use the real clock
+	spec = importlib.util.find_spec(BSP_MODULES[mb_bsp.MB_BSP_BACKEND])
+	bsp = importlib.util.module_from_spec(spec)
+	
+	env = {'MB_BSP_INSTANCE': str(instance), 'MB_CLOCK': 'real'}
+	prev_env = {name: os.environ.get(name) for name in env}
+	prev_instance = mb_bsp.MB_BSP_INSTANCE
+	os.environ.update(env)
+	mb_bsp.MB_BSP_INSTANCE = instance
+	try:
+		spec.loader.exec_module(bsp)
+	finally:
+		mb_bsp.MB_BSP_INSTANCE = prev_instance
+		for name, value in prev_env.items():
+			if value is None:
+				del os.environ[name]
+			else:
+				os.environ[name] = value
+	
+	# The rest of test environment functions is taken from mb_bsp as the
+	# backend does when it is selected there
+	for name in ('clock', 'wait_status_event'):
+		if not hasattr(bsp, name):
+			setattr(bsp, name, getattr(mb_bsp, name))
+	
+	return bsp
+
+
+
+class Bus:
+	def __init__(self, instance, timeout=None):
+		self.instance = instance
+		self.bsp = load_bsp(instance)
+		self.cs_shadow = {'Master': [None] * 4, 'Slave': [None] * 4}
+		self.timeout = timeout		# None - derived from configuration
+		self.timeout_count = 0
+		self.executor = concurrent.futures.ThreadPoolExecutor(1, f'mb_bus{instance}')
+
+
+	def close(self):
+		self.executor.shutdown()
+
+
+	async def call(self, func, *args):
+		# Blocking call in the bus's thread, other buses run meanwhile
+		loop = asyncio.get_running_loop()
+		return await loop.run_in_executor(self.executor, functools.partial(func, *args))
+
+
+	def write_cs(self, modbus_role, cs_reg, wdata):
+		return mb_util.write_cs(modbus_role, cs_reg, wdata, bsp=self.bsp, shadow=self.cs_shadow)
+
+
+	def configure(self, modbus_role, slave_addr, pdu, config_val):
+		if modbus_role == 'Master':
+			self.write_cs('Master', mb_util.CONFIG_REG, config_val)
+			self.write_cs('Master', mb_util.SLAVE_ADDR_REG, slave_addr)
+			self.write_cs('Master', mb_util.PDU_SIZE_REG, len(pdu))
+			self.bsp.write_mb_master_pdu_words(0, mb_util.pack_pdu_words(pdu))
+		else:
+			self.write_cs('Slave', mb_util.CONFIG_REG, config_val)
+			self.write_cs('Slave', mb_util.SLAVE_ADDR_REG, slave_addr)
+
+
+	def read_response(self, response_size):
+		pdu_size = self.bsp.read_mb_master_cs(mb_util.PDU_SIZE_REG)
+		words = self.bsp.read_mb_master_pdu_words(0, mb_util.pdu_wordnum(response_size))
+		return mb_util.unpack_pdu_words(words, min(pdu_size, len(words) << 2))
+
+
+
+async def wait_status(bus, modbus_role, status, timeout=None):
+	# mb_util.wait_status for the bus
+	if timeout is None:
+		timeout = bus.timeout
+	return await bus.call(mb_util.wait_status, modbus_role, status, timeout, bus.bsp, bus.cs_shadow)
+
+
+
+async def wait_mb_master_status(bus, status):
+	result = await wait_status(bus, 'Master', status)
+	if not result.ok:
+		print('*** Bus ', bus.instance, ' test FAILED: ', status , ' timeout ***') 
+		bus.timeout_count += 1
+	
+	return result
+
+
+
+async def config_modbus(bus, modbus_role, slave_addr, pdu, config_val):
+	await wait_mb_master_status(bus, 'FSM status')
+	await bus.call(bus.configure, modbus_role, slave_addr, pdu, config_val)
+
+
+
+async def transaction(bus, slave_addr, pdu, config_val, response_size=mb_util.MB_MAX_PDU_SIZE):
+	# mb_util.transaction for the bus
+	await config_modbus(bus, 'Master', slave_addr, pdu, config_val)
+	await bus.call(bus.bsp.write_mb_master_cs, mb_util.CS_REG, 0)
+	
+	result = await wait_mb_master_status(bus, 'PDU status' if slave_addr else 'FSM status')
+	if not result.ok or not slave_addr:
+		return (result, None)
+	
+	return (result, await bus.call(bus.read_response, response_size))
+
+
+
+async def run_buses(buses, scenario, *args):
+	# Run scenario(bus, *args) coroutine on all buses concurrently,
+	# returns list of their results
+	return await asyncio.gather(*(scenario(bus, *args) for bus in buses))
+
+
+
+async def write_read_scenario(bus, transaction_num):
+	# 0x10 write of random registers and 0x03 read back, random config
+	error_count = 0
+	for i in range(transaction_num):
+		config_val = (randrange(0, 8) << 8) | randrange(0, 4)
+		slave_addr = randrange(mb_util.MB_MIN_SLAVE_ADDR, mb_util.MB_MAX_SLAVE_ADDR + 1)
+		regnum = randrange(1, mb_util.MB_MAX_WRITE_REGNUM + 1)
+		addr = randrange(0, mb_util.MB_MAX_REG_ADDR + 2 - regnum)
+		regval = [randrange(0, mb_util.MB_MAX_REG_VAL + 1) for i in range(regnum)]
+		
+		await config_modbus(bus, 'Slave', slave_addr, [], config_val)
+		
+		request_pdu, ref_pdu = mb_util.generate_0x10_pdu(addr, regnum, regval)
+		result, response_pdu = await transaction(bus, slave_addr, request_pdu, config_val, len(ref_pdu))
+		if not result.ok or bytes(response_pdu) != bytes(ref_pdu):
+			error_count += 1
+			continue
+		
+		request_pdu, ref_pdu = mb_util.generate_0x03_pdu(addr, regnum)
+		result, response_pdu = await transaction(bus, slave_addr, request_pdu, config_val, len(ref_pdu))
+		if 	not result.ok \
+			or response_pdu[2:] != mb_util.REGVAL_STRUCT[regnum].pack(*regval):
+			error_count += 1
+	
+	master_list, slave_list = await bus.call(bus.bsp.get_error_count)
+	
+	return error_count + bus.timeout_count + sum(master_list) + sum(slave_list)
+
+
+
+def run_check(bus_num, transaction_num):
+	print()
+	print('*** Concurrent buses check: ', bus_num, ' buses ***')
+	
+	buses = [Bus(i) for i in range(bus_num)]
+	
+	start = time.monotonic()
+	error_counts = asyncio.run(run_buses(buses, write_read_scenario, transaction_num))
+	elapsed = time.monotonic() - start
+	
+	for bus in buses:
+		bus.close()
+	
+	for bus, error_count in zip(buses, error_counts):
+		if error_count:
+			print('Bus ', bus.instance, ': ', error_count, ' errors')
+	
+	print('Transactions: ', bus_num * transaction_num * 2, '; ', f'{elapsed:.2f} sec')
+	
+	result_ok = not any(error_counts)
+	mb_util.print_test_result(result_ok)
+	
+	return result_ok
+
+
+
+if __name__ == '__main__':
+	bus_num = int(sys.argv[1]) if len(sys.argv) > 1 else 24
+	transaction_num = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+	sys.exit(0 if run_check(bus_num, transaction_num) else 1)
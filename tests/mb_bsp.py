@@ -22,7 +22,12 @@
 
 
 
+import mb_clock
+import mb_profile
+import mb_report
+import mb_trace
 import mb_util
+import os
 import time
 import threading
 
@@ -30,17 +35,68 @@ import threading
 
 TIMEOUT = 5 # sec
 
+# Time of the test environment (mb_clock.py): monotonic(), sleep(); the model
+# backend replaces it with its virtual clock
+clock = mb_clock.RealClock()
+
+# Request processing time of the slave's MCU [sec], None - hardware default
+# (mb_util.MB_PROCESS_TIME); the model backend serves requests at once
+process_time = None
+
+# 'hardware' - functions below, 'model' - software model of the test environment,
+# 'mmap' - memory-mapped registers (mb_bsp_mmap.py)
+MB_BSP_BACKEND = os.environ.get('MB_BSP_BACKEND', 'hardware')
+
+# Test environment instance (board) to connect to, when several ones are used
+# in parallel (mb_sweep.py)
+MB_BSP_INSTANCE = int(os.environ.get('MB_BSP_INSTANCE', '0'))
+
+# Flight recorder (mb_trace.py): the last MB_BSP_TRACE calls of functions in
+# TRACED (0 - disabled) are dumped to MB_BSP_TRACE_FILE on failure or timeout.
+# {test} is replaced with the current test name (mb_report), {instance} with
+# MB_BSP_INSTANCE, so dumps of different tests and instances do not clash
+MB_BSP_TRACE = int(os.environ.get('MB_BSP_TRACE', '4096'))
+MB_BSP_TRACE_FILE = os.environ.get('MB_BSP_TRACE_FILE', 'mb_bsp_trace_{test}_{instance}.bin')
+
+TRACED = (	'read_mb_master_cs',
+			'write_mb_master_cs',
+			'read_mb_slave_cs',
+			'write_mb_slave_cs',
+			'read_mb_master_pdu_words',
+			'write_mb_master_pdu_words',
+			'wait_status_event',
+			'get_pdu_status',
+			'direct_read_mb_slave_reg',
+			'get_error_count',
+			'reset_error_count',
+			'mb_test_select',
+			'mb_test_frame_start',
+			'mb_test_set_configure')
+
+recorder = None
+
 
 
 
 def alarm_cb(msg):	
 	alarm_cb.status_timeout = 1
 	print(time.ctime(), ': *** ', msg, ' ***')	
+	dump_trace(msg)
 
 setattr(alarm_cb, 'status_timeout', 0)
 
 
 
+def dump_trace(reason, test=None):
+	# test - name of the trace file's test, the current test by default
+	if recorder is not None:
+		path = MB_BSP_TRACE_FILE.format(test=test or mb_report.test or 'session', instance=MB_BSP_INSTANCE)
+		recorder.dump(path)
+		print(f'{reason}: last {min(recorder.count, recorder.record_num)} mb_bsp calls '
+				f'are dumped to {path}')
+
+
+
 
 def read_mb_master_cs(cs_reg):
 	# Type here your implementation based on your hardware
@@ -52,6 +108,7 @@ def read_mb_master_cs(cs_reg):
 
 def write_mb_master_cs(cs_reg, wdata):
 	# Type here your implementation based on your hardware
+	pass
 
 
 def read_mb_slave_cs(cs_reg):
@@ -62,28 +119,86 @@ def read_mb_slave_cs(cs_reg):
 
 def write_mb_slave_cs(cs_reg, wdata):
 	# Type here your implementation based on your hardware
+	pass
+		
+
+
+def read_mb_master_pdu_words(pdu_addr, wordnum):
+	# Type here your implementation based on your hardware:
+	# burst read of wordnum PDU interface words starting from pdu_addr,
+	# returned as array('I')
+	
+	return rdata
+		
 		
+		
+def write_mb_master_pdu_words(pdu_addr, words):
+	# Type here your implementation based on your hardware:
+	# burst write of words (array('I')) to PDU interface starting from pdu_addr
+	pass
+
 
 
 def read_mb_master_pdu(size):
-	# Type here your implementation based on your hardware
+	# Returns response PDU as bytes
+	words = read_mb_master_pdu_words(0, mb_util.pdu_wordnum(size))
+	reply = mb_util.unpack_pdu_words(words, size)
 	
 	return reply
 		
 		
 		
 def write_mb_master_pdu(wdata):
-	# Type here your implementation based on your hardware
+	write_mb_master_pdu_words(0, mb_util.pack_pdu_words(wdata))
 			
 
 		
+# Command list: a whole transaction (CS and PDU writes, start, status wait,
+# reads) submitted at once. Command is a tuple of mb_bsp function name and its
+# arguments, e.g. ('write_mb_master_cs', cs_reg, wdata), status wait is
+# ('wait_status', modbus_role, status, timeout).
+
+def submit_commands(commands):
+	# Type here your implementation if your hardware link can execute
+	# a command list as one packet.
+	# Return list of results, one per command: read data, mb_util.WaitResult
+	# for status wait, None for writes and for commands after a failed wait
+	results = list()
+	ok = 1
+	for command in commands:
+		if not ok:
+			result = None
+		elif command[0] == 'wait_status':
+			result = mb_util.wait_status(*command[1:])
+			ok = result.ok
+		else:
+			result = globals()[command[0]](*command[1:])
+		results.append(result)
+	
+	return results
+
+
+
 def wait_master_status(status):
-	# Type here your implementation based on your hardware
+	result = mb_util.wait_status('Master', status)
+	if not result.ok:
+		alarm_cb(status + ' timeout')
+		
 		
+		
+def wait_status_event(modbus_role, status, timeout):
+	# Type here your implementation based on your hardware if it can notify
+	# about status change (e.g. control_pdu edge interrupt):
+	# wait until status is set or timeout [sec] expires, return 1 or 0.
+	# Return None if notification is not supported: status is polled then
+	
+	return None
 				
 
 def get_pdu_status(modbus_role, status):
-	# Type here your implementation based on your hardware
+	# Type here your implementation based on your hardware:
+	# 'FSM status' - 1 if master FSM is ready,
+	# 'PDU status' - 1 if response (master) or request (slave) PDU is received
 		
 	return stat
 
@@ -146,3 +261,16 @@ def mb_test_set_configure(	slave_addr,
 
 
 
+
+if MB_BSP_BACKEND == 'model':
+	from mb_bsp_model import *
+elif MB_BSP_BACKEND == 'mmap':
+	from mb_bsp_mmap import *
+
+if MB_BSP_TRACE:
+	recorder = mb_trace.FlightRecorder(MB_BSP_TRACE)
+	recorder.install(globals(), TRACED)
+
+mb_profile.install(globals(), [name for name in TRACED if name.endswith('_cs')], mb_profile.register_size)
+mb_profile.install(globals(), [name for name in TRACED if not name.endswith('_cs')])
+mb_profile.install(globals(), ['read_mb_master_pdu', 'write_mb_master_pdu', 'submit_commands'])
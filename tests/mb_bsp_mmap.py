@@ -0,0 +1,205 @@
+# MIT License
+
+# Copyright (c) 2021 Vasily Denisenko, Sergey Kuznetsov
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# mb_bsp backend for memory-mapped Avalon slaves (UIO device, /dev/mem or
+# any other mmap-able file). Select it with MB_BSP_BACKEND=mmap environment
+# variable. Registers are accessed by loads and stores to the mapped
+# window, without system calls.
+#
+# Settings (environment variables, offsets are in bytes):
+#	MB_MMAP_DEVICE 		- device or file to map, /dev/uio{instance} by default,
+#						  {instance} is replaced with MB_BSP_INSTANCE
+#	MB_MMAP_OFFSET 		- window offset in the device, e.g. bridge base address
+#						  for /dev/mem
+#	MB_MMAP_SIZE 		- window size
+#	MB_MMAP_MASTER_CS 	- master's CS registers (4 words)
+#	MB_MMAP_MASTER_PDU 	- master's PDU window (mb_util.MB_MAX_PDU_WORDNUM words)
+#	MB_MMAP_SLAVE_CS 	- slave's CS registers (4 words)
+#	MB_MMAP_ERR_COUNT 	- test environment error counters: master's parity,
+#						  start bit, stop bit, address and CRC error counters,
+#						  the same for slave (10 words) and reset strobe (1 word)
+#	MB_MMAP_MAILBOX 	- stand-in mailbox (4 words), see below
+#
+# Stand-in: if the device is a regular file, it is updated by the model
+# process (mb_mmap_model.py) instead of hardware. As a file can't report
+# writes, each write is passed to the model through the mailbox:
+# written words index and number, write sequence number and its
+# acknowledge. Writes wait for the acknowledge, so registers behave as
+# hardware ones.
+#
+# Test environment functions other than error counters are those of mb_bsp.
+
+
+
+import mb_bsp
+import mmap
+import os
+import stat
+import time
+from array import array
+
+
+
+__all__ = [	'read_mb_master_cs',
+			'write_mb_master_cs',
+			'read_mb_slave_cs',
+			'write_mb_slave_cs',
+			'read_mb_master_pdu_words',
+			'write_mb_master_pdu_words',
+			'get_pdu_status',
+			'get_error_count',
+			'reset_error_count']
+
+
+
+MB_MMAP_DEVICE = os.environ.get('MB_MMAP_DEVICE', '/dev/uio{instance}').format(instance=mb_bsp.MB_BSP_INSTANCE)
+MB_MMAP_OFFSET = int(os.environ.get('MB_MMAP_OFFSET', '0'), 0)
+MB_MMAP_SIZE = int(os.environ.get('MB_MMAP_SIZE', '0x1000'), 0)
+MB_MMAP_MASTER_CS = int(os.environ.get('MB_MMAP_MASTER_CS', '0x000'), 0)
+MB_MMAP_SLAVE_CS = int(os.environ.get('MB_MMAP_SLAVE_CS', '0x010'), 0)
+MB_MMAP_ERR_COUNT = int(os.environ.get('MB_MMAP_ERR_COUNT', '0x020'), 0)
+MB_MMAP_MAILBOX = int(os.environ.get('MB_MMAP_MAILBOX', '0x060'), 0)
+MB_MMAP_MASTER_PDU = int(os.environ.get('MB_MMAP_MASTER_PDU', '0x100'), 0)
+
+STANDIN_TIMEOUT = 5 # sec
+
+WORD_TYPECODE = 'I' if array('I').itemsize == 4 else 'L'
+
+# Word indexes
+MASTER_CS = MB_MMAP_MASTER_CS >> 2
+SLAVE_CS = MB_MMAP_SLAVE_CS >> 2
+ERR_COUNT = MB_MMAP_ERR_COUNT >> 2
+ERR_RESET = ERR_COUNT + 10
+MASTER_PDU = MB_MMAP_MASTER_PDU >> 2
+
+MAILBOX_INDEX = (MB_MMAP_MAILBOX >> 2)
+MAILBOX_COUNT = MAILBOX_INDEX + 1
+MAILBOX_SEQ = MAILBOX_INDEX + 2
+MAILBOX_ACK = MAILBOX_INDEX + 3
+
+CS_REG = 3
+
+
+
+def open_window(path, size, offset):
+	fd = os.open(path, os.O_RDWR | os.O_SYNC)
+	try:
+		standin = stat.S_ISREG(os.fstat(fd).st_mode)
+		window = mmap.mmap(fd, size, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE, offset=offset)
+	finally:
+		os.close(fd)
+
+	return (memoryview(window).cast(WORD_TYPECODE), standin)
+
+
+
+words, standin = open_window(MB_MMAP_DEVICE, MB_MMAP_SIZE, MB_MMAP_OFFSET)
+
+
+
+def standin_write(index, count):
+	# Pass write of count words from index to the model and wait for it
+	words[MAILBOX_INDEX] = index
+	words[MAILBOX_COUNT] = count
+	seq = (words[MAILBOX_SEQ] + 1) & 0xFFFFFFFF
+	words[MAILBOX_SEQ] = seq
+	
+	deadline = time.monotonic() + STANDIN_TIMEOUT
+	while words[MAILBOX_ACK] != seq:
+		if time.monotonic() > deadline:
+			raise TimeoutError('No response from stand-in model of ' + MB_MMAP_DEVICE)
+		time.sleep(0)
+
+
+
+def write_word(index, wdata):
+	words[index] = wdata & 0xFFFFFFFF
+	if standin:
+		standin_write(index, 1)
+
+
+
+def read_mb_master_cs(cs_reg):
+	return words[MASTER_CS + cs_reg]
+
+
+
+def write_mb_master_cs(cs_reg, wdata):
+	write_word(MASTER_CS + cs_reg, wdata)
+
+
+
+def read_mb_slave_cs(cs_reg):
+	return words[SLAVE_CS + cs_reg]
+
+
+
+def write_mb_slave_cs(cs_reg, wdata):
+	write_word(SLAVE_CS + cs_reg, wdata)
+
+
+
+# PDU window is copied word by word: slice copies go through memcpy, which
+# may access device memory by bytes or by wider unaligned bursts
+
+def read_mb_master_pdu_words(pdu_addr, wordnum):
+	index = MASTER_PDU + pdu_addr
+	
+	return array(WORD_TYPECODE, [words[i] for i in range(index, index + wordnum)])
+
+
+
+def write_mb_master_pdu_words(pdu_addr, wdata):
+	index = MASTER_PDU + pdu_addr
+	for i, word in enumerate(wdata, index):
+		words[i] = word & 0xFFFFFFFF
+	if standin:
+		standin_write(index, len(wdata))
+
+
+
+def get_pdu_status(modbus_role, status):
+	if modbus_role == 'Master':
+		stat = words[MASTER_CS + CS_REG]
+		if status == 'FSM status':
+			stat = ~stat >> 1 & 0x1		# not busy
+		else:
+			stat &= 0x1
+	else:
+		stat = words[SLAVE_CS + CS_REG] & 0x1	# control_pdu
+
+	return stat
+
+
+
+def get_error_count():
+	master_list = words[ERR_COUNT:ERR_COUNT + 5].tolist()
+	slave_list = words[ERR_COUNT + 5:ERR_COUNT + 10].tolist()
+
+	return (master_list, slave_list)
+
+
+
+def reset_error_count():
+	write_word(ERR_RESET, 1)
+
+	print('Error counters are reset')
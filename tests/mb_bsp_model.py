@@ -0,0 +1,176 @@
+# MIT License
+
+# Copyright (c) 2021 Vasily Denisenko, Sergey Kuznetsov
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+
+
+# mb_bsp backend built on the software model of the test environment.
+# Select it with MB_BSP_BACKEND=model environment variable, e.g.:
+#	MB_BSP_BACKEND=model python mb_norm_exch_test.py
+
+
+
+import mb_clock
+import mb_model
+import os
+
+
+
+__all__ = [	'clock',
+			'process_time',
+			'read_mb_master_cs',
+			'write_mb_master_cs',
+			'read_mb_slave_cs',
+			'write_mb_slave_cs',
+			'read_mb_master_pdu_words',
+			'write_mb_master_pdu_words',
+			'wait_status_event',
+			'get_pdu_status',
+			'direct_read_mb_slave_reg',
+			'get_error_count',
+			'reset_error_count',
+			'mb_test_select',
+			'mb_test_frame_start',
+			'mb_test_set_configure']
+
+
+
+# Virtual time by default (mb_clock.py), MB_CLOCK=real - wall clock, model
+# transactions are finished at once
+bench = mb_model.ModbusTestBench(mb_clock.new_clock(os.environ.get('MB_CLOCK', 'virtual')))
+clock = bench.clock
+
+# Slave application layer of the model serves requests in no virtual time
+process_time = 0
+
+
+
+def read_mb_master_cs(cs_reg):
+	return bench.master.read_cs(cs_reg)
+
+
+
+def write_mb_master_cs(cs_reg, wdata):
+	bench.master.write_cs(cs_reg, wdata)
+	if cs_reg == mb_model.CS_REG:
+		bench.start_transaction()
+
+
+
+def read_mb_slave_cs(cs_reg):
+	return bench.slave.read_cs(cs_reg)
+
+
+
+def write_mb_slave_cs(cs_reg, wdata):
+	bench.slave.write_cs(cs_reg, wdata)
+
+
+
+def read_mb_master_pdu_words(pdu_addr, wordnum):
+	return bench.master.read_pdu_words(pdu_addr, wordnum)
+
+
+
+def write_mb_master_pdu_words(pdu_addr, words):
+	bench.master.write_pdu_words(pdu_addr, words)
+
+
+
+def wait_status_event(modbus_role, status, timeout):
+	# Virtual time runs model events until status is set or timeout expires.
+	# With the real clock model transactions are finished as soon as they
+	# are started, so a status which is not set yet will never be set
+	if clock.virtual:
+		return clock.run_until(lambda: get_pdu_status(modbus_role, status), timeout)
+	
+	return get_pdu_status(modbus_role, status)
+
+
+
+def get_pdu_status(modbus_role, status):
+	if modbus_role == 'Master':
+		if status == 'FSM status':
+			stat = 1 - bench.master.busy
+		else:
+			stat = bench.master.pdu_status
+	else:
+		stat = bench.slave.control_pdu
+
+	return stat
+
+
+
+def direct_read_mb_slave_reg(addr, regnum):
+	rdd_list = bench.app.read_regs(addr, regnum)
+
+	return rdd_list
+
+
+
+def get_error_count():
+	master_list = list(bench.master.err_count)
+	slave_list = list(bench.slave.err_count)
+
+	return (master_list, slave_list)
+
+
+
+def reset_error_count():
+	bench.reset_error_count()
+
+	print('Error counters are reset')
+
+
+
+def mb_test_select(selector):
+	bench.select = selector
+
+	print('Modbus select set to ', selector)
+
+
+
+def mb_test_frame_start():
+	bench.sender_frame_start()
+
+	print('Send test frame')
+
+
+
+def mb_test_set_configure(	slave_addr,
+							stop_bits,
+							parity_ena,
+							parity_type,
+							speed,
+							reg_addr,
+							reg_val,
+							crc):
+	print('Set fcode 0x06 test frame parameters configuration:')
+	bench.sender.configure(slave_addr, stop_bits, parity_ena, parity_type, speed, reg_addr, reg_val, crc)
+	print('slave_addr = ', slave_addr)
+	print('stop_bits = ', stop_bits)
+	print('parity_ena = ', parity_ena)
+	print('parity_type = ', parity_type)
+	print('speed = ', speed)
+	print('reg_addr = ', reg_addr)
+	print('reg_val = ', reg_val)
+	print(f'crc = {crc:#x}')
@@ -0,0 +1,115 @@
+# MIT License
+
+# Copyright (c) 2021 Vasily Denisenko, Sergey Kuznetsov
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+# Clocks for mb_bsp, mb_util and the tests: monotonic time, sleep and model
+# events.
+#
+# - RealClock is the wall clock of the hardware. Model events happen at once:
+#	model transactions are finished as soon as they are started.
+# - VirtualClock is discrete-event time of the software model: model events
+#	(frame end, t3.5 expiry, driver enable, response timeout) are scheduled
+#	at their bus time, sleeps and status waits jump straight to the next
+#	event, so waits and timeouts take no wall time.
+#
+# mb_bsp.clock is the clock of the selected backend: virtual for the model
+# (MB_CLOCK=real turns it back to the wall clock), real for the others.
+
+
+
+import heapq
+import time
+
+
+
+class RealClock:
+	virtual = 0
+	
+	def monotonic(self):
+		return time.monotonic()
+	
+	
+	def sleep(self, delay):
+		if delay > 0:
+			time.sleep(delay)
+	
+	
+	def schedule(self, delay, callback):
+		callback()
+
+
+
+class VirtualClock:
+	virtual = 1
+	
+	def __init__(self):
+		self.now = 0.0
+		self.events = list()	# heap of (time, sequence number, callback)
+		self.seq = 0
+	
+	
+	def monotonic(self):
+		return self.now
+	
+	
+	def sleep(self, delay):
+		self.advance(self.now + max(delay, 0))
+	
+	
+	def schedule(self, delay, callback):
+		heapq.heappush(self.events, (self.now + delay, self.seq, callback))
+		self.seq += 1
+	
+	
+	def run_next(self):
+		self.now, seq, callback = heapq.heappop(self.events)
+		callback()
+	
+	
+	def advance(self, until):
+		# Runs events up to until, then sets time to until
+		while self.events and self.events[0][0] <= until:
+			self.run_next()
+		self.now = max(self.now, until)
+	
+	
+	def run_until(self, condition, timeout):
+		# Runs events until condition() is true (returns 1) or timeout
+		# expires (returns 0)
+		deadline = self.now + timeout
+		while not condition():
+			if not self.events or self.events[0][0] > deadline:
+				self.now = max(self.now, deadline)
+				return 0
+			self.run_next()
+		
+		return 1
+
+
+
+def new_clock(kind):
+	if kind == 'virtual':
+		return VirtualClock()
+	elif kind == 'real':
+		return RealClock()
+	
+	raise ValueError(f'Unknown clock: {kind}')
@@ -50,22 +50,22 @@
 
 # 5. Test normal exchange
 	
-# 6. Display test result.
+# 6. Test batch CRC
+#		- Compare mb_util.crc16_batch with mb_util.crc16 for random frames:
+#		  empty batch, mixed lengths including empty frames, equal lengths.
+
+# 7. Display test result.
 
 
 
 import mb_bsp
+import mb_report
 import mb_util
-import time
 from random import randrange
 
 
 RAND_TEST_SIZE = 1
 
-# Constants
-WAIT_TIME = 0.5 # [seconds]
-
-
 error_count = 0
 
 		
@@ -73,8 +73,6 @@ error_count = 0
 def norm_exch_test(slave_addr, fcode, addr, regnum, regval, speed, conf_bit):		
 	print('Run test for slave:')
 
-	mb_bsp.reset_error_count()
-	
 	# Generate request PDU
 	if fcode == 3:
 		pdu_l = mb_util.generate_0x03_pdu(addr, regnum)
@@ -92,62 +90,56 @@ def norm_exch_test(slave_addr, fcode, addr, regnum, regval, speed, conf_bit):
 	mb_util.config_modbus('Master', slave_addr[0], request_pdu, master_config_val)
 	mb_util.config_modbus('Slave', slave_addr[1], request_pdu, slave_config_val)
 	
-	# Send generated PDU
-	mb_bsp.write_mb_master_cs(mb_util.CS_REG, 0)
-	
-	# Wait while master FSM is busy
-	mb_util.wait_mb_master_status('FSM status')
-	
-	# Check if response received
-	response_received = mb_bsp.get_pdu_status('Master', 'PDU status')	
-	if response_received:
-		print('Response received')
-	else:
-		print('Response isn\'t received')
+	# Send generated PDU, wait while master FSM is busy
+	mb_util.send_request(master_config_val, len(request_pdu))
 	
-	mb_util.print_error_count()	
+	errors = mb_util.get_error_delta()
+	mb_util.print_error_count(errors)
+
+	return errors
 
 
 
 def run_test_s_crc(speed, conf_bit):		
 	print('Run test for slave:')
 
-	mb_bsp.reset_error_count()
-	
 	slave_config_val = (conf_bit[1] << 8) | speed[1]
 	
 	# Configure Modbus slave
 	mb_util.config_modbus('Slave', 1, [], slave_config_val)
 		
 	# Configure mb_0x6_sender module 
-	true_crc = 0xCA89
-	fake_crc = randrange(0, 65536)
-	while fake_crc == true_crc:
-		fake_crc = randrange(0, 65536)
+	reg_addr = randrange(0, mb_util.MB_MAX_REG_ADDR + 1)
+	reg_val = randrange(0, mb_util.MB_MAX_REG_VAL + 1)
+	sender_pdu = mb_util.generate_0x06_pdu(reg_addr, [reg_val])[0]
+	true_crc = mb_util.frame_crc(1, sender_pdu)
+	fake_crc = mb_util.generate_fake_crc(true_crc)
 	mb_bsp.mb_test_set_configure(	1, 			# slave_addr
 									(conf_bit[1] & 0x4) >> 2, 			# stop_bits
 									conf_bit[1] & 0x1, 			# parity_ena
 									(conf_bit[1] & 0x2) >> 1,			# parity_type
 									speed[1],			# speed
-									0,			# reg_addr
-									0,			# reg_val
+									reg_addr,			# reg_addr
+									reg_val,			# reg_val
 									fake_crc)		# crc
 	
 	# Trigger mb_0x6_sender module to send frame
 	mb_bsp.mb_test_frame_start()
 	
-	# Wait while Slave process request
-	time.sleep(WAIT_TIME)
+	# Wait while Slave receives the frame and detects its end
+	mb_bsp.clock.sleep(	mb_util.frame_end_time(slave_config_val, len(sender_pdu)) + \
+						mb_util.MB_ACCESS_TIME)
 	
-	mb_util.print_error_count()	
+	errors = mb_util.get_error_delta()
+	mb_util.print_error_count(errors)
+
+	return errors
 
 	
 		
 def run_test_m_crc(speed, conf_bit):		
 	print('Run test for master:')
 
-	mb_bsp.reset_error_count()
-
 	# Generate request PDU
 	pdu_l = mb_util.generate_0x06_pdu(0, [0])
 	
@@ -160,49 +152,69 @@ def run_test_m_crc(speed, conf_bit):
 	mb_util.config_modbus('Slave', 1, request_pdu, master_config_val)
 	
 	# Configure mb_0x6_sender module 
-	true_crc = 0xCA89
-	fake_crc = randrange(0, 65536)
-	while fake_crc == true_crc:
-		fake_crc = randrange(0, 65536)
+	reg_addr = randrange(0, mb_util.MB_MAX_REG_ADDR + 1)
+	reg_val = randrange(0, mb_util.MB_MAX_REG_VAL + 1)
+	sender_pdu = mb_util.generate_0x06_pdu(reg_addr, [reg_val])[0]
+	true_crc = mb_util.frame_crc(1, sender_pdu)
+	fake_crc = mb_util.generate_fake_crc(true_crc)
 	mb_bsp.mb_test_set_configure(	1, 			# slave_addr
 									(conf_bit[0] & 0x4) >> 2, 			# stop_bits
 									conf_bit[0] & 0x1, 			# parity_ena
 									(conf_bit[0] & 0x2) >> 1,			# parity_type
 									speed[0],			# speed
-									0,			# reg_addr
-									0,			# reg_val
+									reg_addr,			# reg_addr
+									reg_val,			# reg_val
 									fake_crc)		# crc
 									
 	# Connect mb_0x6_sender module to modbus_rtu_master
 	mb_bsp.mb_test_select(1)
 	
-	# Send generated PDU
-	mb_bsp.write_mb_master_cs(mb_util.CS_REG, 0)
-	
-	# Wait while master FSM is busy
-	mb_util.wait_mb_master_status('FSM status')
-	
-	# Check if response received
-	response_received = mb_bsp.get_pdu_status('Master', 'PDU status')	
-	if response_received:
-		print('Response received')
-	else:
-		print('Response isn\'t received')
+	# Send generated PDU, wait while master FSM is busy
+	mb_util.send_request(master_config_val, len(request_pdu))
 
 	# Unconnect mb_0x6_sender module from modbus_rtu_master
 	mb_bsp.mb_test_select(0)
 	
-	mb_util.print_error_count()	
+	errors = mb_util.get_error_delta()
+	mb_util.print_error_count(errors)
+
+	return errors
+	
+	
+
+def run_test_crc_batch():
+	print('Run batch CRC test:')
+	
+	failed = 0
+	sizes = [0] + [randrange(0, 2 * mb_util.MB_MAX_PDU_SIZE) for i in range(20)]
+	batches = [	[],
+				[bytes(randrange(0, 256) for i in range(size)) for size in sizes],
+				[bytes(randrange(0, 256) for i in range(16)) for j in range(10)]]
+	for frames in batches:
+		crc = mb_util.crc16_batch(frames)
+		ref_crc = [mb_util.crc16(frame) for frame in frames]
+		if crc != ref_crc:
+			print('*** Test FAILED: Batch CRC is not valid ***')
+			print('frame sizes = ', [len(frame) for frame in frames])
+			print('crc = ', crc)
+			print('ref_crc = ', ref_crc)
+			failed = 1
+	
+	return failed
 	
 	
 
 def run_tests():
 	global error_count;
+	
+	error_count = 0
+	mb_util.reset_err_count()
 
+	mb_report.begin('crc')
 	print()
 	print('*** Start CRC test ***')
 	
-	mb_bsp.reset_error_count()
+	mb_util.get_error_delta()	# Error counters baseline
 	
 	# Generate regnum 
 	regnum = 1
@@ -227,46 +239,46 @@ def run_tests():
 	
 	# Do transaction and check error counters
 	print('Start normal exchange')
-	norm_exch_test(addr, mb_util.FCODE_0x6, 0, regnum, regval, speed, conf_bit)
-	if	mb_util.get_total_error_count('Both') > 0 \
-		or mb_util.incr_err_count.count > 0:
-		error_count += 1
-		print('DEBUG: norm_exch_test')
+	errors = norm_exch_test(addr, mb_util.FCODE_0x6, 0, regnum, regval, speed, conf_bit)
+	failed = 	errors.total('Both') > 0 \
+				or mb_util.incr_err_count.count > 0
+	error_count += mb_report.step('norm_exch_test', failed, errors, speed=speed, conf_bit=conf_bit)
 	
 	for i in range(RAND_TEST_SIZE):
-		run_test_s_crc(speed, conf_bit)
-		if	mb_util.get_single_error_count('Slave', 'crc') == 0 \
-			or	mb_util.get_total_error_count('Master') > 0 \
-			or	mb_util.incr_err_count.count > 0:
-			error_count += 1
-			print('DEBUG: run_test_s_crc')
+		errors = run_test_s_crc(speed, conf_bit)
+		failed = 	errors.single('Slave', 'crc') == 0 \
+					or	errors.total('Master') > 0 \
+					or	mb_util.incr_err_count.count > 0
+		error_count += mb_report.step('run_test_s_crc', failed, errors, speed=speed, conf_bit=conf_bit)
 		
 	print('Start normal exchange')		
-	norm_exch_test(addr, mb_util.FCODE_0x6, 0, regnum, regval, speed, conf_bit)
-	if	mb_util.get_total_error_count('Both') > 0 \
-		or	mb_util.incr_err_count.count > 0:
-		error_count += 1
-		print('DEBUG: norm_exch_test')
+	errors = norm_exch_test(addr, mb_util.FCODE_0x6, 0, regnum, regval, speed, conf_bit)
+	failed = 	errors.total('Both') > 0 \
+				or	mb_util.incr_err_count.count > 0
+	error_count += mb_report.step('norm_exch_test', failed, errors, speed=speed, conf_bit=conf_bit)
 		
 	for i in range(RAND_TEST_SIZE):
-		run_test_m_crc(speed, conf_bit)
-		if	mb_util.get_total_error_count('Slave') > 0 \
-			or mb_util.get_single_error_count('Master', 'crc') == 0 \
-			or	mb_util.incr_err_count.count > 0:
-			error_count += 1
-			print('DEBUG: run_test_m_crc')
+		errors = run_test_m_crc(speed, conf_bit)
+		failed = 	errors.total('Slave') > 0 \
+					or errors.single('Master', 'crc') == 0 \
+					or	mb_util.incr_err_count.count > 0
+		error_count += mb_report.step('run_test_m_crc', failed, errors, speed=speed, conf_bit=conf_bit)
 	
 	print('Start normal exchange')		
-	norm_exch_test(addr, mb_util.FCODE_0x6, 0, regnum, regval, speed, conf_bit)
-	if	mb_util.get_total_error_count('Both') > 0 \
-		or mb_util.incr_err_count.count > 0:
-		error_count += 1
-		print('DEBUG: norm_exch_test')
+	errors = norm_exch_test(addr, mb_util.FCODE_0x6, 0, regnum, regval, speed, conf_bit)
+	failed = 	errors.total('Both') > 0 \
+				or mb_util.incr_err_count.count > 0
+	error_count += mb_report.step('norm_exch_test', failed, errors, speed=speed, conf_bit=conf_bit)
 
+	error_count += mb_report.step('run_test_crc_batch', run_test_crc_batch())
+	
 	print('Timeout error count = ', mb_util.incr_err_count.count)
 	
 
 	mb_util.print_test_result(error_count == 0)
 	
+	return error_count == 0
+	
 	
-run_tests()
+if __name__ == '__main__':
+	run_tests()
@@ -0,0 +1,105 @@
+# MIT License
+
+# Copyright (c) 2021 Vasily Denisenko, Sergey Kuznetsov
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Stand-in for memory-mapped test environment: serves a regular file, mapped
+# by mb_bsp_mmap backend, with the software model of the test environment
+# (mb_bsp_model). Register layout is the one of mb_bsp_mmap.
+#
+# Usage:
+#	python3 mb_mmap_model.py /tmp/mb_regs &
+#	MB_BSP_BACKEND=mmap MB_MMAP_DEVICE=/tmp/mb_regs python3 mb_test_interfaces.py
+
+
+
+import os
+import sys
+import time
+
+
+
+POLL_TIME = 0.00005 # sec
+
+
+
+def publish(mm, model):
+	# Copy model's registers read values to the file
+	import mb_util
+	
+	for cs_reg in range(4):
+		mm.words[mm.MASTER_CS + cs_reg] = model.read_mb_master_cs(cs_reg)
+		mm.words[mm.SLAVE_CS + cs_reg] = model.read_mb_slave_cs(cs_reg)
+	
+	pdu_words = model.read_mb_master_pdu_words(0, mb_util.MB_MAX_PDU_WORDNUM)
+	mm.words[mm.MASTER_PDU:mm.MASTER_PDU + mb_util.MB_MAX_PDU_WORDNUM] = memoryview(pdu_words)
+	
+	master_list, slave_list = model.get_error_count()
+	mm.words[mm.ERR_COUNT:mm.ERR_COUNT + 10] = memoryview(mm.array(mm.WORD_TYPECODE, master_list + slave_list))
+
+
+
+def apply_write(mm, model, index, count):
+	import mb_util
+	
+	if mm.MASTER_CS <= index < mm.MASTER_CS + 4:
+		model.write_mb_master_cs(index - mm.MASTER_CS, mm.words[index])
+	elif mm.SLAVE_CS <= index < mm.SLAVE_CS + 4:
+		model.write_mb_slave_cs(index - mm.SLAVE_CS, mm.words[index])
+	elif mm.MASTER_PDU <= index < mm.MASTER_PDU + mb_util.MB_MAX_PDU_WORDNUM:
+		model.write_mb_master_pdu_words(index - mm.MASTER_PDU, mm.read_mb_master_pdu_words(index - mm.MASTER_PDU, count))
+	elif index == mm.ERR_RESET:
+		model.reset_error_count()
+
+
+
+def serve(path):
+	size = int(os.environ.get('MB_MMAP_SIZE', '0x1000'), 0)
+	with open(path, 'wb') as f:
+		f.truncate(size)
+	
+	# mb_bsp_mmap maps MB_MMAP_DEVICE on import
+	os.environ['MB_MMAP_DEVICE'] = path
+	os.environ['MB_MMAP_OFFSET'] = '0'
+	# Client polls registers in wall time: model transactions finish at once
+	os.environ['MB_CLOCK'] = 'real'
+	import mb_bsp_mmap as mm
+	import mb_bsp_model as model
+	
+	publish(mm, model)
+	ack = mm.words[mm.MAILBOX_SEQ]
+	mm.words[mm.MAILBOX_ACK] = ack
+	print('Serving ', path)
+	
+	while True:
+		seq = mm.words[mm.MAILBOX_SEQ]
+		if seq == ack:
+			time.sleep(POLL_TIME)
+			continue
+		
+		apply_write(mm, model, mm.words[mm.MAILBOX_INDEX], mm.words[mm.MAILBOX_COUNT])
+		publish(mm, model)
+		ack = seq
+		mm.words[mm.MAILBOX_ACK] = ack
+
+
+
+if __name__ == '__main__':
+	serve(sys.argv[1])
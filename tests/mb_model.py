@@ -0,0 +1,515 @@
+# MIT License
+
+# Copyright (c) 2021 Vasily Denisenko, Sergey Kuznetsov
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+
+# Software model of the test environment (see 'Test environment.svg'):
+
+# - ModbusRtuSlave mirrors modbus_rtu_slave.sv: CS and PDU interface address
+#	space, RTU mode FSM, frame buffer, CRC engine and error pulses.
+# - ModbusRtuMaster is the matching model of modbus_rtu_master.
+# - Mb0x6Sender is the mb_0x6_sender test module.
+# - ModbusTestBench connects them like the test environment does and plays
+#	the role of the MCU firmware serving the slave.
+
+# Serial line is modelled at the bit level only when transmitter and receiver
+# settings differ, so error pulses appear the same way the uart_receiver
+# module produces them. With equal settings frames are passed as bytes.
+
+# Frames are delivered as events of the bench clock (mb_clock.py): with
+# the virtual clock at their bus time (driver enable, frame and t3.5 of the
+# receiver), a request without response ends with the master's response
+# timeout; with the real clock at once.
+
+
+
+import mb_clock
+import mb_slave_app
+import mb_util
+
+
+
+# Module parameters, taken from the instantiation template in modbus_rtu_slave.sv;
+# baud rate divisors and driver enable time are those of mb_util timing
+CONFIG_DEFAULT = 0x01
+ADDR_DEFAULT = 1
+
+MAX_MODBUS_RTU_FRAME_SIZE = 256
+MIN_MODBUS_RTU_FRAME_SIZE = 4
+MAX_MODBUS_RTU_PDU_SIZE = 253
+MIN_MODBUS_RTU_PDU_SIZE = 1
+MIN_MODBUS_RTU_ADDR = 1
+MAX_MODBUS_RTU_ADDR = 247
+
+# CS interface address space
+PDU_SIZE_REG = 0
+CONFIG_REG = 1
+SLAVE_ADDR_REG = 2
+CS_REG = 3
+
+CONFIG_MASK = (0x7 << 8) | 0x3
+
+# Error counters order, the same as in mb_bsp.get_error_count lists
+PARITY_ERR = 0
+START_BIT_ERR = 1
+STOP_BIT_ERR = 2
+ADDR_ERR = 3
+CRC_ERR = 4
+ERR_NUM = 5
+
+
+
+def crc16(data, size):
+	return mb_util.crc16(memoryview(data)[:size])
+
+
+
+# Serial line
+
+def uart_serialize(frame, config):
+	parity_ena = (config >> 8) & 0x1
+	parity_type = (config >> 9) & 0x1
+	stop_bits = ((config >> 10) & 0x1) + 1
+
+	bits = bytearray()
+	for byte in frame:
+		bits.append(0)
+		parity = parity_type
+		for i in range(8):
+			bit = (byte >> i) & 0x1
+			parity ^= bit
+			bits.append(bit)
+		if parity_ena:
+			bits.append(parity)
+		bits.extend(b'\x01' * stop_bits)
+
+	return bits
+
+
+
+def uart_settings_match(tx_config, rx_config):
+	# Equal baud rates and parity settings, receiver's stop bits number
+	# is less or equal to transmitter's one
+	tx_mode = (tx_config >> 8) & 0x7
+	rx_mode = (rx_config >> 8) & 0x7
+	if mb_util.baud_divisor(tx_config & 0x3) != mb_util.baud_divisor(rx_config & 0x3):
+		return False
+	if (tx_mode & 0x1) != (rx_mode & 0x1):
+		return False
+	if (tx_mode & 0x1) and (tx_mode & 0x2) != (rx_mode & 0x2):
+		return False
+
+	return (tx_mode & 0x4) >= (rx_mode & 0x4)
+
+
+
+def uart_receive(frame, tx_config, rx_config):
+	# Returns received bytes and [parity, start bit, stop bit] error pulse counts
+	err_count = [0, 0, 0]
+	if uart_settings_match(tx_config, rx_config):
+		return (bytearray(frame), err_count)
+
+	bits = uart_serialize(frame, tx_config)
+	bits_num = len(bits)
+	tx_div = mb_util.baud_divisor(tx_config & 0x3)
+	rx_div = mb_util.baud_divisor(rx_config & 0x3)
+	parity_ena = (rx_config >> 8) & 0x1
+	parity_type = (rx_config >> 9) & 0x1
+	stop_bits = ((rx_config >> 10) & 0x1) + 1
+
+	def level(t):
+		k = t // tx_div
+		if k >= bits_num:
+			return 1
+		return bits[k]
+
+	data = bytearray()
+	k = 0
+	while True:
+		# Look for the falling edge of a start bit
+		while k < bits_num and not (bits[k] == 0 and (k == 0 or bits[k - 1] == 1)):
+			k += 1
+		if k >= bits_num:
+			break
+
+		t = k * tx_div + (rx_div >> 1)
+		if level(t) == 1:
+			err_count[1] += 1
+			k = t // tx_div + 1
+			continue
+
+		byte = 0
+		parity = parity_type
+		for i in range(8):
+			t += rx_div
+			bit = level(t)
+			parity ^= bit
+			byte |= bit << i
+
+		if parity_ena:
+			t += rx_div
+			if level(t) != parity:
+				err_count[0] += 1
+
+		for i in range(stop_bits):
+			t += rx_div
+			if level(t) == 0:
+				err_count[2] += 1
+				break
+
+		data.append(byte)
+		k = t // tx_div + 1
+
+	return (data, err_count)
+
+
+
+def frame_delay(frame, tx_config, rx_config):
+	# Driver enable to the frame end detection by the receiver [sec]
+	return 	mb_util.de_time() + len(frame) * mb_util.char_time(tx_config) + \
+			mb_util.t35_time(rx_config)
+
+
+
+# PDU interface bursts: word pdu_addr holds frame bytes 4 * pdu_addr + 1 ... 4 * pdu_addr + 4
+
+def read_frame_words(frame_byte, pdu_addr, wordnum):
+	i = ((pdu_addr & 0x3F) << 2) + 1
+	buf = bytearray(wordnum << 2)
+	data = frame_byte[i:i + len(buf)]
+	buf[:len(data)] = data
+	return mb_util.pack_pdu_words(buf)
+
+
+
+def write_frame_words(frame_byte, pdu_addr, words):
+	i = ((pdu_addr & 0x3F) << 2) + 1
+	data = mb_util.unpack_pdu_words(words, len(words) << 2)
+	size = min(len(data), MAX_MODBUS_RTU_FRAME_SIZE - i)
+	frame_byte[i:i + size] = data[:size]
+
+
+
+class ModbusRtuSlave:
+	def __init__(self):
+		self.frame_byte = bytearray(MAX_MODBUS_RTU_FRAME_SIZE)
+		self.err_count = [0] * ERR_NUM
+		self.reset()
+
+
+	def reset(self):
+		self.frame_byte[:] = bytes(MAX_MODBUS_RTU_FRAME_SIZE)
+		self.pdu_size = 0
+		self.config = (0x1 << 8) | CONFIG_DEFAULT
+		self.slave_addr = ADDR_DEFAULT
+		self.ptr = 0
+		self.control_pdu = 0
+		self.frame_error = 0
+		self.tx_frame = None
+
+
+	def unicast_mode(self):
+		return int(self.frame_byte[0] != 0)
+
+
+	def read_cs(self, cs_reg):
+		cs_reg &= 0x3
+		if cs_reg == PDU_SIZE_REG:
+			return (self.ptr - 3) & 0x1FF
+		elif cs_reg == CONFIG_REG:
+			return self.config
+		elif cs_reg == SLAVE_ADDR_REG:
+			return self.slave_addr
+
+		return (self.unicast_mode() << 1) | self.control_pdu
+
+
+	def write_cs(self, cs_reg, wdata):
+		cs_reg &= 0x3
+		wdata &= 0xFFFFFFFF
+		if cs_reg == PDU_SIZE_REG:
+			if MIN_MODBUS_RTU_PDU_SIZE <= wdata <= MAX_MODBUS_RTU_PDU_SIZE:
+				self.pdu_size = wdata
+		elif cs_reg == CONFIG_REG:
+			self.config = wdata & CONFIG_MASK
+		elif cs_reg == SLAVE_ADDR_REG:
+			if MIN_MODBUS_RTU_ADDR <= wdata <= MAX_MODBUS_RTU_ADDR:
+				self.slave_addr = wdata
+		elif self.control_pdu:
+			# Process end: reply to master (unicast) or finish transaction (broadcast)
+			self.control_pdu = 0
+			if self.unicast_mode():
+				size = self.pdu_size + 1
+				crc = crc16(self.frame_byte, size)
+				self.frame_byte[size] = crc & 0xFF
+				self.frame_byte[size + 1] = crc >> 8
+				self.ptr = size + 2
+				self.tx_frame = bytes(self.frame_byte[:self.ptr])
+			self.frame_error = 0
+
+
+	def read_pdu_words(self, pdu_addr, wordnum):
+		return read_frame_words(self.frame_byte, pdu_addr, wordnum)
+
+
+	def write_pdu_words(self, pdu_addr, words):
+		# Frame buffer is loaded from rxd while the FSM waits for a request
+		if self.control_pdu:
+			write_frame_words(self.frame_byte, pdu_addr, words)
+
+
+	def receive(self, frame, tx_config):
+		# Receiver is held in init state while the request is processed
+		if self.control_pdu:
+			return
+
+		data, err_count = uart_receive(frame, tx_config, self.config)
+		for i in range(3):
+			self.err_count[i] += err_count[i]
+			if err_count[i]:
+				self.frame_error = 1
+
+		if not data:
+			return
+
+		self.ptr = 0
+		for byte in data:
+			if self.ptr < MAX_MODBUS_RTU_FRAME_SIZE:
+				self.frame_byte[self.ptr] = byte
+			self.ptr = (self.ptr + 1) & 0x1FF
+
+		# Frame control after t1.5
+		if self.unicast_mode() and self.frame_byte[0] != self.slave_addr:
+			self.err_count[ADDR_ERR] += 1
+			self.frame_error = 1
+
+		if not self.frame_error:
+			size = (self.ptr - 2) & 0xFF
+			crc = crc16(self.frame_byte, size)
+			crc_l = self.frame_byte[(self.ptr - 2) & 0xFF]
+			crc_h = self.frame_byte[(self.ptr - 1) & 0xFF]
+			if crc != (crc_h << 8) | crc_l:
+				self.err_count[CRC_ERR] += 1
+				self.frame_error = 1
+
+		if self.frame_error:
+			self.frame_error = 0
+		else:
+			self.control_pdu = 1
+
+
+	def transmit(self):
+		frame = self.tx_frame
+		self.tx_frame = None
+		return frame
+
+
+
+class ModbusRtuMaster:
+	# CS interface address space is the same as the slave's one, except:
+	# - PDU size register write sets request PDU size, read returns response PDU size;
+	# - Slave address register accepts 0 (broadcast);
+	# - Control and status register write starts transaction, read returns
+	#	[0] - response PDU is received, [1] - FSM is busy.
+
+	def __init__(self):
+		self.frame_byte = bytearray(MAX_MODBUS_RTU_FRAME_SIZE)
+		self.err_count = [0] * ERR_NUM
+		self.reset()
+
+
+	def reset(self):
+		self.frame_byte[:] = bytes(MAX_MODBUS_RTU_FRAME_SIZE)
+		self.pdu_size = 0
+		self.config = (0x1 << 8) | CONFIG_DEFAULT
+		self.slave_addr = ADDR_DEFAULT
+		self.ptr = 0
+		self.pdu_status = 0
+		self.busy = 0
+
+
+	def read_cs(self, cs_reg):
+		cs_reg &= 0x3
+		if cs_reg == PDU_SIZE_REG:
+			return (self.ptr - 3) & 0x1FF
+		elif cs_reg == CONFIG_REG:
+			return self.config
+		elif cs_reg == SLAVE_ADDR_REG:
+			return self.slave_addr
+
+		return (self.busy << 1) | self.pdu_status
+
+
+	def write_cs(self, cs_reg, wdata):
+		cs_reg &= 0x3
+		wdata &= 0xFFFFFFFF
+		if cs_reg == PDU_SIZE_REG:
+			if MIN_MODBUS_RTU_PDU_SIZE <= wdata <= MAX_MODBUS_RTU_PDU_SIZE:
+				self.pdu_size = wdata
+		elif cs_reg == CONFIG_REG:
+			self.config = wdata & CONFIG_MASK
+		elif cs_reg == SLAVE_ADDR_REG:
+			if wdata <= MAX_MODBUS_RTU_ADDR:
+				self.slave_addr = wdata
+		elif not self.busy:
+			self.busy = 1
+			self.pdu_status = 0
+
+
+	def read_pdu_words(self, pdu_addr, wordnum):
+		return read_frame_words(self.frame_byte, pdu_addr, wordnum)
+
+
+	def write_pdu_words(self, pdu_addr, words):
+		if not self.busy:
+			write_frame_words(self.frame_byte, pdu_addr, words)
+
+
+	def broadcast_mode(self):
+		return self.slave_addr == 0
+
+
+	def transmit(self):
+		self.frame_byte[0] = self.slave_addr
+		size = self.pdu_size + 1
+		crc = crc16(self.frame_byte, size)
+		self.frame_byte[size] = crc & 0xFF
+		self.frame_byte[size + 1] = crc >> 8
+		self.ptr = size + 2
+		return bytes(self.frame_byte[:self.ptr])
+
+
+	def receive(self, frame, tx_config):
+		# frame is None if no response was sent: response timeout
+		if frame is not None:
+			data, err_count = uart_receive(frame, tx_config, self.config)
+			frame_error = 0
+			for i in range(3):
+				self.err_count[i] += err_count[i]
+				if err_count[i]:
+					frame_error = 1
+
+			if data:
+				self.ptr = 0
+				for byte in data:
+					if self.ptr < MAX_MODBUS_RTU_FRAME_SIZE:
+						self.frame_byte[self.ptr] = byte
+					self.ptr = (self.ptr + 1) & 0x1FF
+
+				if self.frame_byte[0] != self.slave_addr:
+					self.err_count[ADDR_ERR] += 1
+					frame_error = 1
+
+				if not frame_error:
+					size = (self.ptr - 2) & 0xFF
+					crc = crc16(self.frame_byte, size)
+					crc_l = self.frame_byte[(self.ptr - 2) & 0xFF]
+					crc_h = self.frame_byte[(self.ptr - 1) & 0xFF]
+					if crc != (crc_h << 8) | crc_l:
+						self.err_count[CRC_ERR] += 1
+						frame_error = 1
+
+				if not frame_error:
+					self.pdu_status = 1
+
+		self.busy = 0
+
+
+
+class Mb0x6Sender:
+	def __init__(self):
+		self.configure(1, 0, 0, 0, CONFIG_DEFAULT, 0, 0, 0)
+
+
+	def configure(self, slave_addr, stop_bits, parity_ena, parity_type, speed, reg_addr, reg_val, crc):
+		self.config = (stop_bits << 10) | (parity_type << 9) | (parity_ena << 8) | (speed & 0x3)
+		self.frame = bytes([	slave_addr & 0xFF,
+								0x6,
+								(reg_addr >> 8) & 0xFF,
+								reg_addr & 0xFF,
+								(reg_val >> 8) & 0xFF,
+								reg_val & 0xFF,
+								crc & 0xFF,
+								(crc >> 8) & 0xFF])
+
+
+
+class ModbusTestBench:
+	def __init__(self, clock=None):
+		self.clock = mb_clock.RealClock() if clock is None else clock
+		self.master = ModbusRtuMaster()
+		self.slave = ModbusRtuSlave()
+		self.sender = Mb0x6Sender()
+		self.select = 0
+		self.app = mb_slave_app.SlaveApp(	self.slave.read_cs, self.slave.write_cs,
+											self.slave.read_pdu_words, self.slave.write_pdu_words)
+
+
+	def reset_error_count(self):
+		self.master.err_count[:] = [0] * ERR_NUM
+		self.slave.err_count[:] = [0] * ERR_NUM
+
+
+	def start_transaction(self):
+		if not self.master.busy:
+			return
+
+		request = self.master.transmit()
+		self.clock.schedule(	frame_delay(request, self.master.config, self.slave.config),
+								lambda: self.request_end(request))
+
+
+	def request_end(self, request):
+		self.slave.receive(request, self.master.config)
+		self.serve_slave()
+		response = self.slave.transmit()
+
+		if self.master.broadcast_mode():
+			self.master.receive(None, 0)
+		elif self.select:
+			# mb_0x6_sender replies instead of the slave
+			frame = self.sender.frame
+			self.clock.schedule(	frame_delay(frame, self.sender.config, self.master.config),
+									lambda: self.master.receive(frame, self.sender.config))
+		elif response is None:
+			self.clock.schedule(mb_util.MB_RESPONSE_TIMEOUT, lambda: self.master.receive(None, 0))
+		else:
+			config = self.slave.config
+			self.clock.schedule(	frame_delay(response, config, self.master.config),
+									lambda: self.master.receive(response, config))
+
+
+	def sender_frame_start(self):
+		frame = self.sender.frame
+		config = self.sender.config
+		self.clock.schedule(frame_delay(frame, config, self.slave.config), lambda: self.sender_frame_end(frame, config))
+
+
+	def sender_frame_end(self, frame, config):
+		self.slave.receive(frame, config)
+		self.serve_slave()
+		self.slave.transmit()
+
+
+	def serve_slave(self):
+		# MCU firmware: application layer for fcodes 0x03, 0x06, 0x10
+		self.app.poll()
@@ -35,6 +35,7 @@
 
 
 import mb_bsp
+import mb_report
 import mb_util
 from random import randrange
 
@@ -44,7 +45,7 @@ RAND_TEST_SIZE = 1
 
 
 
-def run_test_positive(slave_addr, fcode, addr, regnum, regval, speed, conf_bit):	
+def exchange_positive(slave_addr, fcode, addr, regnum, regval, speed, conf_bit):	
 	# Generate request PDU and reference response PDU
 	if fcode == 3:
 		pdu_l = mb_util.generate_0x03_pdu(addr, regnum)
@@ -57,26 +58,21 @@ def run_test_positive(slave_addr, fcode, addr, regnum, regval, speed, conf_bit):
 	master_config_val = (conf_bit[0] << 8) | speed[0]
 	slave_config_val = (conf_bit[1] << 8) | speed[1]
 	
-	# Configure Modbus master and slave
-	mb_util.config_modbus('Master', slave_addr[0], request_pdu, master_config_val)
+	# Configure Modbus slave
 	mb_util.config_modbus('Slave', slave_addr[1], request_pdu, slave_config_val)
 	
-	# Send generated PDU
-	mb_bsp.write_mb_master_cs(mb_util.CS_REG, 0)
+	# Configure Modbus master, send generated PDU and wait for response PDU
+	result, response_pdu = mb_util.transaction(slave_addr[0], request_pdu, master_config_val, len(ref_pdu))
+	if not result.ok:
+		return
 
 	if slave_addr[0] != 0:	# unicast
-		# Wait for master response is received
-		mb_util.wait_mb_master_status('PDU status')
-		if mb_util.incr_err_count.count > 0:
-			return
-			
-		pdu_size = mb_bsp.read_mb_master_cs(mb_util.PDU_SIZE_REG)		# Get response PDU size
-		response_pdu = mb_bsp.read_mb_master_pdu(pdu_size)		# Get response PDU
+		pdu_size = len(response_pdu)
 	
 		if fcode == 3:
-			pdu_mismatch = ref_pdu[0:2] != response_pdu[0:2] or len(ref_pdu) != len(response_pdu)
+			pdu_mismatch = bytes(ref_pdu[0:2]) != bytes(response_pdu[0:2]) or len(ref_pdu) != len(response_pdu)
 		else:
-			pdu_mismatch = ref_pdu != response_pdu
+			pdu_mismatch = bytes(ref_pdu) != bytes(response_pdu)
 		
 		# Process response PDU
 		if pdu_mismatch:
@@ -93,20 +89,11 @@ def run_test_positive(slave_addr, fcode, addr, regnum, regval, speed, conf_bit):
 			for i in range(pdu_size):
 				print(f'{response_pdu[i]:#d}')
 	else:	# broadcast
-		# Wait for master FSM is ready
-		mb_bsp.wait_master_status('FSM status') 
-		
-		if mb_bsp.alarm_cb.status_timeout == 1:
-			print('*** Broadcast test FAILED: FSM status timeout ***') 
-			mb_bsp.alarm_cb.status_timeout = 0
+		response_received = mb_bsp.get_pdu_status('Master', 'PDU status')		
+		if response_received:
+			print('*** Broadcast test FAILED: Broadcast reply is received ***')
 			mb_util.incr_err_count()
 			return
-		else:		
-			response_received = mb_bsp.get_pdu_status('Master', 'PDU status')		
-			if response_received:
-				print('*** Broadcast test FAILED: Broadcast reply is received ***')
-				mb_util.incr_err_count()
-				return
 		
 		if fcode == 16:
 			slave_regval = mb_bsp.direct_read_mb_slave_reg(addr, regnum)
@@ -118,11 +105,22 @@ def run_test_positive(slave_addr, fcode, addr, regnum, regval, speed, conf_bit):
 	
 
 
+def run_test_positive(slave_addr, fcode, addr, regnum, regval, speed, conf_bit):
+	err_count = mb_util.incr_err_count.count
+	exchange_positive(slave_addr, fcode, addr, regnum, regval, speed, conf_bit)
+	mb_report.step(	'unicast' if slave_addr[0] else 'broadcast', mb_util.incr_err_count.count != err_count,
+					fcode=fcode, regnum=regnum, speed=speed, conf_bit=conf_bit, addresses=slave_addr)
+
+
+
 def run_tests():
+	mb_report.begin('norm_exch')
 	print()
 	print('*** Start normal exchange test ***')
 	
-	mb_bsp.reset_error_count()
+	mb_util.reset_err_count()
+	
+	mb_util.get_error_delta()	# Error counters baseline
 	
 	# Generate frame parameters to select from
 	fcode_l = [mb_util.FCODE_0x3, mb_util.FCODE_0x10]
@@ -192,16 +190,20 @@ def run_tests():
 	# Do transaction with 0x10 function code and check response
 	run_test_positive(addr, mb_util.FCODE_0x10, 0, mb_util.MB_MAX_WRITE_REGNUM, regval, speed, conf_bit)
 
-	mb_util.print_error_count()
+	errors = mb_util.get_error_delta()
+	mb_util.print_error_count(errors)
 	
 	print('Timeout error count = ', mb_util.incr_err_count.count)
 	
 	
-	result_ok = 	mb_util.get_total_error_count('Both') == 0 \
+	result_ok = 	errors.total('Both') == 0 \
 					and mb_util.incr_err_count.count == 0
 	mb_util.print_test_result(result_ok)
+	
+	return result_ok
 
 
 
 	
-run_tests()
+if __name__ == '__main__':
+	run_tests()
@@ -47,6 +47,7 @@
 
 
 import mb_bsp
+import mb_report
 import mb_util
 from random import randrange
 
@@ -57,8 +58,6 @@ error_count = 0
 def run_test_s_parity(slave_addr, fcode, addr, regnum, regval, speed, conf_bit):
 	print('Run test for slave:')
 
-	mb_bsp.reset_error_count()
-	
 	# Generate request PDU
 	if fcode == 3:
 		pdu_l = mb_util.generate_0x03_pdu(addr, regnum)
@@ -74,27 +73,18 @@ def run_test_s_parity(slave_addr, fcode, addr, regnum, regval, speed, conf_bit):
 	mb_util.config_modbus('Master', slave_addr[0], request_pdu, master_config_val)
 	mb_util.config_modbus('Slave', slave_addr[1], request_pdu, slave_config_val)
 	
-	# Send generated PDU
-	mb_bsp.write_mb_master_cs(mb_util.CS_REG, 0)
-
-	# Wait while master FSM is busy
-	mb_util.wait_mb_master_status('FSM status')
-	
-	# Check if response received
-	response_received = mb_bsp.get_pdu_status('Master', 'PDU status')	
-	if response_received:
-		print('Response received')
-	else:
-		print('Response isn\'t received')
+	# Send generated PDU, wait while master FSM is busy
+	mb_util.send_request(master_config_val, len(request_pdu))
 	
-	mb_util.print_error_count()	
+	errors = mb_util.get_error_delta()
+	mb_util.print_error_count(errors)
+
+	return errors
 	
 	
 	
 def run_test_m_parity(speed, conf_bit):	
 	print('Run test for master:')
-	
-	mb_bsp.reset_error_count()
 
 	# Generate request PDU
 	pdu_l = mb_util.generate_0x06_pdu(0, [0])
@@ -108,7 +98,7 @@ def run_test_m_parity(speed, conf_bit):
 	mb_util.config_modbus('Slave', 1, request_pdu, master_config_val)
 	
 	# Configure mb_0x6_sender module
-	true_crc = 0xCA89
+	true_crc = mb_util.frame_crc(1, request_pdu)
 	mb_bsp.mb_test_set_configure(	1, 			# slave_addr
 									(conf_bit[0] & 0x4) >> 2, 			# stop_bits
 									conf_bit[0] & 0x1, 			# parity_ena
@@ -121,33 +111,30 @@ def run_test_m_parity(speed, conf_bit):
 	# Connect mb_0x6_sender module to modbus_rtu_master	
 	mb_bsp.mb_test_select(1)
 	
-	# Send generated PDU
-	mb_bsp.write_mb_master_cs(mb_util.CS_REG, 0)
-	
-	# Wait while master FSM is busy
-	mb_util.wait_mb_master_status('FSM status')
-	
-	# Check if response received
-	response_received = mb_bsp.get_pdu_status('Master', 'PDU status')	
-	if response_received:
-		print('Response received')
-	else:
-		print('Response isn\'t received')
+	# Send generated PDU, wait while master FSM is busy
+	mb_util.send_request(master_config_val, len(request_pdu))
 	
 	# Unconnect mb_0x6_sender module from modbus_rtu_master
 	mb_bsp.mb_test_select(0)
 	
-	mb_util.print_error_count()	
+	errors = mb_util.get_error_delta()
+	mb_util.print_error_count(errors)
+
+	return errors
 
 
 
 def run_tests():
 	global error_count;
 	
+	error_count = 0
+	mb_util.reset_err_count()
+	
+	mb_report.begin('parity')
 	print()
 	print('*** Start parity test ***')
 	
-	mb_bsp.reset_error_count()
+	mb_util.get_error_delta()	# Error counters baseline
 	
 	# Generate parity list to select from
 	parity_l = [i for i in range(2)] 
@@ -184,32 +171,35 @@ def run_tests():
 			conf_bit = [master_conf_bit, slave_conf_bit]
 			
 			# Do transaction and check error counters
-			run_test_s_parity(addr, mb_util.FCODE_0x10, 0, regnum, regval, speed, conf_bit)
+			errors = run_test_s_parity(addr, mb_util.FCODE_0x10, 0, regnum, regval, speed, conf_bit)
 			if master_parity == slave_parity:
-				if	mb_util.get_total_error_count('Both') > 0 \
-					or	mb_util.incr_err_count.count > 0:
-					error_count += 1
+				failed = 	errors.total('Both') > 0 \
+							or	mb_util.incr_err_count.count > 0
+				error_count += mb_report.step('run_test_s_parity', failed, errors, speed=speed, conf_bit=conf_bit)
 			else:
-				if	mb_util.get_total_error_count('Master') > 0 \
-					or	mb_util.get_single_error_count('Slave', 'parity') == 0 \
-					or	mb_util.incr_err_count.count != 0:
-					error_count += 1
+				failed = 	errors.total('Master') > 0 \
+							or	errors.single('Slave', 'parity') == 0 \
+							or	mb_util.incr_err_count.count != 0
+				error_count += mb_report.step('run_test_s_parity', failed, errors, speed=speed, conf_bit=conf_bit)
 			
-				run_test_m_parity(speed, conf_bit)
-				if	mb_util.get_single_error_count('Master', 'parity') == 0 \
-					or mb_util.get_total_error_count('Slave') > 0 \
-					or	mb_util.incr_err_count.count > 0:
-					error_count += 1
+				errors = run_test_m_parity(speed, conf_bit)
+				failed = 	errors.single('Master', 'parity') == 0 \
+							or errors.total('Slave') > 0 \
+							or	mb_util.incr_err_count.count > 0
+				error_count += mb_report.step('run_test_m_parity', failed, errors, speed=speed, conf_bit=conf_bit)
 			
 
 
 	print('Timeout error count = ', mb_util.incr_err_count.count)
 	
 	mb_util.print_test_result(error_count == 0)		
+	
+	return error_count == 0
 
 	
 	
 
-run_tests()
+if __name__ == '__main__':
+	run_tests()
 
 
@@ -0,0 +1,131 @@
+# MIT License
+
+# Copyright (c) 2021 Vasily Denisenko, Sergey Kuznetsov
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+
+
+# PDU builders micro-benchmark:
+# list-based builders (as they were before struct-based ones) against
+# mb_util.generate_0x03/0x06/0x10_pdu with and without preallocated buffer
+# (0x06 builder takes no buffer).
+
+
+
+import mb_util
+import time
+from random import randrange
+
+
+
+BENCH_SIZE = 100000
+
+
+
+def list_0x03_pdu(addr, regnum):
+	pdu = list()
+	ref_pdu = list()
+	pdu.append(0x3)
+	ref_pdu.append(0x3)
+	pdu.append((addr & 0xff00) >> 8)
+	pdu.append(addr & 0xff)
+	pdu.append((regnum & 0xff00) >> 8)
+	pdu.append(regnum & 0xff)
+	bytecount = regnum << 1
+	ref_pdu.append(bytecount)
+	for i in range(bytecount):
+		ref_pdu.append(0)
+
+	return [pdu, ref_pdu]
+
+
+
+def list_0x06_pdu(addr, regval):
+	pdu = list()
+	pdu.append(0x6)
+	pdu.append((addr & 0xff00) >> 8)
+	pdu.append(addr & 0xff)
+	pdu.append((regval[0] & 0xff00) >> 8)
+	pdu.append(regval[0] & 0xff)
+	ref_pdu = pdu.copy()
+
+	return [pdu, ref_pdu]
+
+
+
+def list_0x10_pdu(addr, regnum, regval):
+	pdu = list()
+	pdu.append(0x10)
+	pdu.append((addr & 0xff00) >> 8)
+	pdu.append(addr & 0xff)
+	pdu.append((regnum & 0xff00) >> 8)
+	regnum_l = regnum & 0xff
+	pdu.append(regnum_l)
+	ref_pdu = pdu.copy()
+	pdu.append(regnum_l << 1)
+	for i in range(regnum_l):
+		pdu.append((regval[i] & 0xff00) >> 8)
+		pdu.append(regval[i] & 0xff)
+
+	return [pdu, ref_pdu]
+
+
+
+def measure(name, builder, args, ref_rate=None):
+	start = time.perf_counter()
+	for a in args:
+		builder(*a)
+	rate = len(args) / (time.perf_counter() - start)
+	if ref_rate is None:
+		print(f'{name:<28}{rate:>14,.0f} PDUs/sec')
+	else:
+		print(f'{name:<28}{rate:>14,.0f} PDUs/sec{rate / ref_rate:>8.1f} x')
+
+	return rate
+
+
+
+def run_bench():
+	print()
+	print('*** PDU builders benchmark ***')
+	print()
+
+	buf = mb_util.new_pdu_buffer()
+	regval = [randrange(0, mb_util.MB_MAX_REG_VAL + 1) for i in range(mb_util.MB_MAX_WRITE_REGNUM)]
+
+	args_0x03 = [(randrange(0, mb_util.MB_MAX_REG_ADDR + 1), randrange(1, mb_util.MB_MAX_READ_REGNUM + 1)) for i in range(BENCH_SIZE)]
+	args_0x06 = [(randrange(0, mb_util.MB_MAX_REG_ADDR + 1), regval) for i in range(BENCH_SIZE)]
+	args_0x10 = [(randrange(0, mb_util.MB_MAX_REG_ADDR + 1), randrange(1, mb_util.MB_MAX_WRITE_REGNUM + 1), regval) for i in range(BENCH_SIZE)]
+
+	for fcode, list_builder, builder, args, buffered in [
+			('0x03', list_0x03_pdu, mb_util.generate_0x03_pdu, args_0x03, True),
+			('0x06', list_0x06_pdu, mb_util.generate_0x06_pdu, args_0x06, False),
+			('0x10', list_0x10_pdu, mb_util.generate_0x10_pdu, args_0x10, True)]:
+		rate_list = measure(fcode + ' list', list_builder, args)
+		measure(fcode + ' struct', builder, args, rate_list)
+		if buffered:
+			measure(fcode + ' struct, buffer', builder, [a + (buf,) for a in args], rate_list)
+		print()
+
+
+
+if __name__ == '__main__':
+	run_bench()
@@ -0,0 +1,212 @@
+# MIT License
+
+# Copyright (c) 2021 Vasily Denisenko, Sergey Kuznetsov
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Master's polling scheduler: register groups of slaves (0x03 reads) are
+# polled with their periods, each poll must be done within its period.
+# Polls are ordered by the earliest deadline (EDF), ties by priority.
+# Bus time of a poll is the transaction time of the frame-time model
+# (mb_util.transaction_time) with the slave's response time.
+#
+# plan_schedule checks a schedule before it is run: bus utilization and
+# non-preemptive EDF simulation over the hyperperiod. If the schedule
+# exceeds bus capacity, it reports tasks to drop, lowest priority first.
+# run_schedule polls slaves through mb_util.transaction.
+#
+# Usage (example schedule check): python3 mb_poll_scheduler.py [config value]
+
+
+
+import heapq
+import math
+import mb_bsp
+import mb_util
+import sys
+from collections import namedtuple
+
+
+
+# period [sec], greater priority wins ties
+PollTask = namedtuple('PollTask', ['name', 'slave_addr', 'addr', 'regnum', 'period', 'priority'])
+
+SLAVE_TIME = 0.001		# slave response time: request end to response start [sec]
+HORIZON_MAX = 1000		# simulation horizon limit, in the longest periods
+TIME_EPS = 1e-9			# time comparison tolerance [sec]
+
+
+
+def poll_time(task, config_val, slave_time=SLAVE_TIME):
+	return mb_util.transaction_time(	config_val,
+										mb_util.request_pdu_size(mb_util.FCODE_0x3, task.regnum),
+										mb_util.response_pdu_size(mb_util.FCODE_0x3, task.regnum),
+										slave_time)
+
+
+
+def utilization(tasks, config_val, slave_time=SLAVE_TIME):
+	return sum(poll_time(task, config_val, slave_time) / task.period for task in tasks)
+
+
+
+def simulate(tasks, config_val, slave_time=SLAVE_TIME):
+	# Non-preemptive EDF over the hyperperiod (all tasks released at 0).
+	# Returns per task [polls, missed deadlines, max response time]; polls
+	# still pending at the horizon with their deadline within it are missed
+	cost = [poll_time(task, config_val, slave_time) for task in tasks]
+	period_us = [max(1, round(task.period * 1e6)) for task in tasks]
+	horizon = min(math.lcm(*period_us), HORIZON_MAX * max(period_us)) / 1e6
+	
+	stats = [[0, 0, 0.0] for task in tasks]
+	release = [0.0] * len(tasks)
+	pending = list()		# (deadline, -priority, task index, release)
+	queued = [0] * len(tasks)
+	t = 0.0
+	while t < horizon:
+		for i, task in enumerate(tasks):
+			while release[i] <= t:
+				if queued[i]:
+					stats[i][1] += 1		# previous poll is not done yet: skipped
+				else:
+					heapq.heappush(pending, (release[i] + task.period, -task.priority, i, release[i]))
+					queued[i] = 1
+				release[i] += task.period
+		
+		if not pending:
+			t = min(release)
+			continue
+		
+		deadline, priority, i, released = heapq.heappop(pending)
+		queued[i] = 0
+		t += cost[i]
+		stats[i][0] += 1
+		stats[i][2] = max(stats[i][2], t - released)
+		if t > deadline + TIME_EPS:
+			stats[i][1] += 1
+	
+	for deadline, priority, i, released in pending:
+		if deadline <= horizon + TIME_EPS:
+			stats[i][1] += 1
+	for i, task in enumerate(tasks):
+		if not stats[i][0] and not stats[i][1] and task.period <= horizon + TIME_EPS:
+			stats[i][1] += 1
+	
+	return stats
+
+
+
+def schedulable(tasks, config_val, slave_time=SLAVE_TIME, stats=None):
+	# No missed deadline and bus utilization within capacity
+	if stats is None:
+		stats = simulate(tasks, config_val, slave_time)
+	
+	return	utilization(tasks, config_val, slave_time) <= 1 + TIME_EPS \
+			and not any(missed for polls, missed, response in stats)
+
+
+
+def plan_schedule(tasks, config_val, slave_time=SLAVE_TIME):
+	# Print schedule report, returns 1 if no deadline is missed and bus
+	# utilization is within capacity
+	print()
+	print(f'*** Poll schedule, config = {config_val:#x} ***')
+	print()
+	
+	stats = simulate(tasks, config_val, slave_time)
+	print(f'{"task":<12}{"addr":>5}{"regs":>6}{"period ms":>11}{"prio":>6}{"poll ms":>10}{"load %":>8}{"max resp ms":>13}{"missed":>8}')
+	for task, (polls, missed, response) in zip(tasks, stats):
+		cost = poll_time(task, config_val, slave_time)
+		print(	f'{task.name:<12}{task.slave_addr:>5}{task.regnum:>6}{task.period * 1e3:>11.1f}'
+				f'{task.priority:>6}{cost * 1e3:>10.3f}{cost / task.period * 100:>8.1f}'
+				f'{response * 1e3:>13.3f}{missed:>8}')
+	
+	load = utilization(tasks, config_val, slave_time)
+	result_ok = schedulable(tasks, config_val, slave_time, stats)
+	print()
+	print(f'Bus utilization: {load * 100:.1f} %')
+	
+	if not result_ok:
+		print('*** Schedule exceeds bus capacity ***')
+		# Keep the highest priority tasks which fit
+		fit = list()
+		for task in sorted(tasks, key=lambda task: -task.priority):
+			if schedulable(fit + [task], config_val, slave_time):
+				fit.append(task)
+		print('Tasks to drop: ', ', '.join(task.name for task in tasks if task not in fit))
+	
+	return result_ok
+
+
+
+def run_schedule(tasks, config_val, duration, on_values=None):
+	# Poll slaves for duration [sec]. on_values(task, regval) is called for
+	# every response. Returns per task [polls, missed deadlines, failed polls]
+	stats = [[0, 0, 0] for task in tasks]
+	clock = mb_bsp.clock
+	start = clock.monotonic()
+	release = [start] * len(tasks)
+	
+	while True:
+		now = clock.monotonic()
+		if now - start >= duration:
+			break
+		
+		ready = [i for i in range(len(tasks)) if release[i] <= now]
+		if not ready:
+			clock.sleep(min(release) - now)
+			continue
+		
+		i = min(ready, key=lambda i: (release[i] + tasks[i].period, -tasks[i].priority))
+		task = tasks[i]
+		deadline = release[i] + task.period
+		
+		pdu, ref_pdu = mb_util.generate_0x03_pdu(task.addr, task.regnum)
+		result, response_pdu = mb_util.transaction(task.slave_addr, pdu, config_val, len(ref_pdu))
+		stats[i][0] += 1
+		if result.ok and len(response_pdu) == len(ref_pdu) and response_pdu[0] == mb_util.FCODE_0x3:
+			if on_values is not None:
+				on_values(task, list(mb_util.REGVAL_STRUCT[task.regnum].unpack_from(response_pdu, 2)))
+		else:
+			stats[i][2] += 1
+		
+		if clock.monotonic() > deadline:
+			stats[i][1] += 1
+		
+		# The next poll is released a period after this one, skipping missed releases
+		release[i] += task.period
+		if release[i] < now:
+			release[i] += math.ceil((now - release[i]) / task.period) * task.period
+	
+	return stats
+
+
+
+EXAMPLE_TASKS = [	PollTask('drive 1', 1, 0, 10, 0.05, 3),
+					PollTask('drive 2', 2, 0, 10, 0.05, 3),
+					PollTask('meter 1', 10, 100, 40, 0.2, 2),
+					PollTask('meter 2', 11, 100, 40, 0.2, 2),
+					PollTask('io', 20, 0, 4, 0.02, 4),
+					PollTask('log', 30, 1000, 125, 1.0, 1)	]
+
+
+
+if __name__ == '__main__':
+	config_val = int(sys.argv[1], 0) if len(sys.argv) > 1 else 0x3
+	plan_schedule(EXAMPLE_TASKS, config_val)
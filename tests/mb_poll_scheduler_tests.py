@@ -0,0 +1,103 @@
+# MIT License
+
+# Copyright (c) 2021 Vasily Denisenko, Sergey Kuznetsov
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+
+# Test algorithm in script:
+
+# 1. Tune slave response time so that a poll takes POLL_TIME exactly.
+
+# 2. Plan an overloaded schedule: A polled every POLL_TIME, B every
+#	 2 * POLL_TIME with lower priority (150 % bus utilization).
+#		- Check that the schedule is rejected and B's polls are missed.
+
+# 3. Plan a feasible schedule: A every 2 * POLL_TIME, B every 4 * POLL_TIME
+#	 (75 % bus utilization).
+#		- Check that the schedule is accepted and every task is polled
+#		  without missed deadlines.
+
+# 4. Display test result.
+
+
+
+import mb_poll_scheduler
+import mb_report
+import mb_util
+
+
+
+CONFIG_VAL = 0x3
+POLL_TIME = 0.006
+
+error_count = 0
+
+
+
+def run_test_schedule(name, periods, expected_ok):
+	global error_count;
+	
+	prev_error_count = error_count
+	tasks = [	mb_poll_scheduler.PollTask('A', 1, 0, 10, periods[0], 2),
+				mb_poll_scheduler.PollTask('B', 2, 0, 10, periods[1], 1)]
+	slave_time = POLL_TIME - mb_poll_scheduler.poll_time(tasks[0], CONFIG_VAL, 0)
+	
+	result_ok = mb_poll_scheduler.plan_schedule(tasks, CONFIG_VAL, slave_time)
+	stats = mb_poll_scheduler.simulate(tasks, CONFIG_VAL, slave_time)
+	if bool(result_ok) != expected_ok:
+		print('*** Test FAILED: Schedule is ', 'rejected' if expected_ok else 'accepted', ' ***')
+		error_count += 1
+	
+	if expected_ok and any(polls == 0 or missed for polls, missed, response in stats):
+		print('*** Test FAILED: Polls are missed in a feasible schedule ***')
+		print('stats = ', stats)
+		error_count += 1
+	
+	if not expected_ok and stats[1][1] == 0:
+		print('*** Test FAILED: Missed polls of the lower priority task are not counted ***')
+		print('stats = ', stats)
+		error_count += 1
+	
+	mb_report.step(name, error_count != prev_error_count, periods=periods)
+
+
+
+def run_tests():
+	global error_count;
+	
+	error_count = 0
+	
+	mb_report.begin('poll_scheduler')
+	print()
+	print('*** Start poll scheduler test ***')
+	
+	run_test_schedule('overloaded', [POLL_TIME, 2 * POLL_TIME], False)
+	run_test_schedule('feasible', [2 * POLL_TIME, 4 * POLL_TIME], True)
+	
+	result_ok = error_count == 0
+	mb_util.print_test_result(result_ok)
+	
+	return result_ok
+
+
+
+if __name__ == '__main__':
+	run_tests()
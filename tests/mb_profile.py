@@ -0,0 +1,156 @@
+# MIT License
+
+# Copyright (c) 2021 Vasily Denisenko, Sergey Kuznetsov
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+# Opt-in profiling of mb_bsp entry points and mb_util helpers built on them:
+# per-function call count, cumulative and max duration, bytes moved.
+# Enable with MB_PROFILE=1 environment variable, e.g.:
+#	MB_BSP_BACKEND=model MB_PROFILE=1 python mb_crc_tests.py
+# Summary table is printed with the test result. When disabled functions are
+# not wrapped at all.
+#
+# Durations are inclusive (config_modbus includes its write_cs calls);
+# 'unattributed' is the rest of the wall time: test scripts' own code and
+# printing.
+
+
+
+import os
+import time
+from array import array
+
+
+
+MB_PROFILE = int(os.environ.get('MB_PROFILE', '0'))
+
+
+
+class FunctionStats:
+	__slots__ = ('count', 'total', 'max', 'bytes')
+	
+	def __init__(self):
+		self.count = 0
+		self.total = 0		# ns
+		self.max = 0		# ns
+		self.bytes = 0
+
+
+
+stats = dict()
+depth = [0]				# nesting of profiled calls
+top_time = [0]			# ns spent in outermost profiled calls
+start_time = [time.monotonic_ns()]
+
+
+
+def data_size(args, result):
+	# Bytes of buffers (arrays, bytes) passed or returned
+	size = 0
+	for x in (result,) + args:
+		if isinstance(x, (bytes, bytearray, array, memoryview)):
+			size += memoryview(x).nbytes
+	
+	return size
+
+
+
+def config_size(args, result):
+	# mb_util.config_modbus writes the request PDU for the master only
+	if args and args[0] == 'Master':
+		return data_size(args, result)
+	
+	return 0
+
+
+
+def register_size(args, result):
+	# Control/status register access moves one 32-bit word
+	return 4
+
+
+
+def wrap(func, sizer=data_size):
+	func_stats = stats.setdefault(func.__name__, FunctionStats())
+	clock = time.monotonic_ns
+	
+	def profiled(*args, **kwargs):
+		depth[0] += 1
+		start = clock()
+		try:
+			result = func(*args, **kwargs)
+		finally:
+			duration = clock() - start
+			depth[0] -= 1
+			if not depth[0]:
+				top_time[0] += duration
+			func_stats.count += 1
+			func_stats.total += duration
+			if duration > func_stats.max:
+				func_stats.max = duration
+		func_stats.bytes += sizer(args, result)
+		
+		return result
+	
+	profiled.__name__ = func.__name__
+	profiled.__wrapped__ = func
+	profiled.__dict__ = func.__dict__		# function attributes are shared
+	
+	return profiled
+
+
+
+def install(namespace, names, sizer=data_size):
+	# Replaces functions of the namespace (module globals) with profiled ones
+	# if profiling is enabled
+	if MB_PROFILE:
+		for name in names:
+			namespace[name] = wrap(namespace[name], sizer)
+
+
+
+def reset():
+	for func_stats in stats.values():
+		func_stats.__init__()
+	top_time[0] = 0
+	start_time[0] = time.monotonic_ns()
+
+
+
+def print_summary():
+	# Prints and resets the statistics
+	elapsed = time.monotonic_ns() - start_time[0]
+	called = [(name, func_stats) for name, func_stats in stats.items() if func_stats.count]
+	if not called:
+		return
+	
+	called.sort(key=lambda item: item[1].total, reverse=True)
+	print()
+	print('*** Profile ***')
+	print(f'{"function":<28}{"calls":>9}{"total ms":>11}{"mean us":>10}{"max us":>10}{"bytes":>11}')
+	for name, func_stats in called:
+		print(	f'{name:<28}{func_stats.count:>9}{func_stats.total / 1e6:>11.1f}'
+				f'{func_stats.total / func_stats.count / 1e3:>10.1f}{func_stats.max / 1e3:>10.1f}'
+				f'{func_stats.bytes:>11}')
+	print(f'{"unattributed":<28}{"":>9}{(elapsed - top_time[0]) / 1e6:>11.1f}')
+	print(f'{"wall time":<28}{"":>9}{elapsed / 1e6:>11.1f}')
+	
+	reset()
@@ -0,0 +1,189 @@
+# MIT License
+
+# Copyright (c) 2021 Vasily Denisenko, Sergey Kuznetsov
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Test algorithm in script:
+
+# 1. Plan reads of a known variable layout with several max_gap values.
+#		- Check requests against expected ones: gaps up to max_gap are merged,
+#		  longer gaps and requests over 125 registers stay split.
+
+# 2. Write random values to a random register area of Slave by 0x10 requests.
+
+# 3. Select random variables (address, regnum) in the area.
+
+# 4. Read variables by coalesced 0x03 requests (mb_util.read_variables).
+#		- Check variables' values against Slave's registers.
+#		- Check the number of requests: not more than the number of variables,
+#		  every request reads not more than 125 registers.
+
+# 5. Display test result.
+
+
+
+import mb_bsp
+import mb_report
+import mb_util
+from random import randrange
+
+
+RAND_TEST_SIZE = 10
+AREA_SIZE = 1000
+VAR_NUM = 40
+
+# Known layout: name - address or (address, regnum)
+LAYOUT = {	'a': (100, 2),
+			'b': (102, 1),		# adjacent
+			'c': (105, 2),		# gap 2
+			'd': (110, 1),		# gap 3
+			'e': 111,			# adjacent, one register
+			'f': (150, 4),		# gap 38
+			'g': (151, 1),		# inside f
+			'h': (200, 100),	# gap 46
+			'i': (300, 30)	}	# adjacent, 130 registers with h
+
+# max_gap: expected requests (address, regnum, [(name, offset, regnum)])
+LAYOUT_PLANS = {0: 	[	(100, 3, [('a', 0, 2), ('b', 2, 1)]),
+						(105, 2, [('c', 0, 2)]),
+						(110, 2, [('d', 0, 1), ('e', 1, 1)]),
+						(150, 4, [('f', 0, 4), ('g', 1, 1)]),
+						(200, 100, [('h', 0, 100)]),
+						(300, 30, [('i', 0, 30)])],
+				2: 	[	(100, 7, [('a', 0, 2), ('b', 2, 1), ('c', 5, 2)]),
+						(110, 2, [('d', 0, 1), ('e', 1, 1)]),
+						(150, 4, [('f', 0, 4), ('g', 1, 1)]),
+						(200, 100, [('h', 0, 100)]),
+						(300, 30, [('i', 0, 30)])],
+				3: 	[	(100, 12, [('a', 0, 2), ('b', 2, 1), ('c', 5, 2), ('d', 10, 1), ('e', 11, 1)]),
+						(150, 4, [('f', 0, 4), ('g', 1, 1)]),
+						(200, 100, [('h', 0, 100)]),
+						(300, 30, [('i', 0, 30)])],
+				50: [	(100, 54, [	('a', 0, 2), ('b', 2, 1), ('c', 5, 2), ('d', 10, 1), ('e', 11, 1),
+									('f', 50, 4), ('g', 51, 1)]),
+						(200, 100, [('h', 0, 100)]),
+						(300, 30, [('i', 0, 30)])]	}
+
+error_count = 0
+
+
+
+def run_test_plan_layout(max_gap):
+	global error_count;
+	
+	requests = mb_util.plan_reads(LAYOUT, max_gap)
+	print('max_gap = ', max_gap, '; variables = ', len(LAYOUT), '; requests = ', len(requests))
+	if [tuple(request) for request in requests] != LAYOUT_PLANS[max_gap]:
+		print('*** Test FAILED: Read plan is not the expected one ***')
+		print('requests = ', [tuple(request) for request in requests])
+		print('expected = ', LAYOUT_PLANS[max_gap])
+		error_count += 1
+
+
+
+def run_test_read_plan(slave_addr, config_val, max_gap):
+	global error_count;
+	
+	# Fill register area
+	area_addr = randrange(0, mb_util.MB_MAX_REG_ADDR + 2 - AREA_SIZE)
+	for addr in range(area_addr, area_addr + AREA_SIZE, mb_util.MB_MAX_WRITE_REGNUM):
+		regnum = min(mb_util.MB_MAX_WRITE_REGNUM, area_addr + AREA_SIZE - addr)
+		regval = [randrange(0, mb_util.MB_MAX_REG_VAL + 1) for i in range(regnum)]
+		pdu, ref_pdu = mb_util.generate_0x10_pdu(addr, regnum, regval)
+		mb_util.transaction(slave_addr, pdu, config_val, len(ref_pdu))
+	
+	# Select variables
+	variables = dict()
+	for i in range(VAR_NUM):
+		regnum = randrange(1, 5)
+		variables[f'var{i}'] = (randrange(area_addr, area_addr + AREA_SIZE - regnum + 1), regnum)
+	
+	requests = mb_util.plan_reads(variables, max_gap)
+	print('max_gap = ', max_gap, '; variables = ', len(variables), '; requests = ', len(requests))
+	if 		len(requests) > len(variables) \
+		or	any(request.regnum > mb_util.MB_MAX_READ_REGNUM for request in requests):
+		print('*** Test FAILED: Read plan is not valid ***')
+		error_count += 1
+	
+	values = mb_util.read_variables(slave_addr, variables, config_val, max_gap)
+	if values is None:
+		print('*** Test FAILED: Read request failed ***')
+		error_count += 1
+		return
+	
+	for name, (addr, regnum) in variables.items():
+		slave_regval = mb_bsp.direct_read_mb_slave_reg(addr, regnum)
+		if values[name] != slave_regval:
+			print('*** Test FAILED: ', name, ' value is not valid ***')
+			print('value = ', values[name])
+			print('slave_regval = ', slave_regval)
+			error_count += 1
+
+
+
+def run_tests():
+	global error_count;
+	
+	error_count = 0
+	mb_util.reset_err_count()
+	
+	mb_report.begin('read_plan')
+	print()
+	print('*** Start read coalescing test ***')
+	
+	mb_util.get_error_delta()	# Error counters baseline
+	
+	for max_gap in LAYOUT_PLANS:
+		prev_error_count = error_count
+		run_test_plan_layout(max_gap)
+		mb_report.step('plan_layout', error_count != prev_error_count, max_gap=max_gap)
+	
+	for i in range(RAND_TEST_SIZE):
+		speed = randrange(0, 4)
+		conf_bit = randrange(0, 8)
+		config_val = (conf_bit << 8) | speed
+		address = randrange(1, mb_util.MB_MAX_SLAVE_ADDR + 1)
+		print('speed = ', speed, '; conf_bit = ', conf_bit, '; address = ', address)
+		
+		mb_util.config_modbus('Slave', address, [], config_val)
+		
+		# No gaps, gap threshold of the configuration, whole requests
+		for max_gap in [0, mb_util.read_gap_threshold(config_val), mb_util.MB_MAX_READ_REGNUM]:
+			prev_error_count = error_count
+			run_test_read_plan(address, config_val, max_gap)
+			mb_report.step(	'read_plan', error_count != prev_error_count,
+							config=config_val, address=address, max_gap=max_gap)
+	
+	errors = mb_util.get_error_delta()
+	mb_util.print_error_count(errors)
+	
+	print('Timeout error count = ', mb_util.incr_err_count.count)
+	
+	result_ok = 	error_count == 0 \
+					and errors.total('Both') == 0 \
+					and mb_util.incr_err_count.count == 0
+	mb_util.print_test_result(result_ok)
+	
+	return result_ok
+
+
+
+if __name__ == '__main__':
+	run_tests()
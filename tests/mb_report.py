@@ -0,0 +1,194 @@
+# MIT License
+
+# Copyright (c) 2021 Vasily Denisenko, Sergey Kuznetsov
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+# Structured test results: step records (test, step, verdict, error counters,
+# configuration, timings) are buffered and written in bulk at the end of each
+# test to MB_REPORT.jsonl (JSON Lines) and MB_REPORT.xml (JUnit XML), e.g.:
+#	MB_BSP_BACKEND=model MB_REPORT=results/run python mb_test_suite.py
+# Records and transaction latencies are also stored to the MB_RESULTS
+# database (mb_results.py).
+# While reporting, console output of a test is held per step: it is shown
+# only for failed steps, followed by the summary at the end of the test.
+
+
+
+import io
+import json
+import os
+import sys
+import time
+import mb_results
+import xml.etree.ElementTree as ET
+
+
+
+MB_REPORT = os.environ.get('MB_REPORT', '')		# output files prefix, '' - disabled
+
+records = list()		# all records of the run
+transactions = list()	# transactions of the current test, stored to MB_RESULTS
+test = None				# current test name
+test_first = 0			# index of the current test's first record
+test_start = 0
+step_start = 0
+step_output = None		# console output held since previous step
+console = sys.stdout
+
+
+
+def begin(name):
+	global test, test_first, test_start, step_start, step_output, console
+	
+	test = name
+	test_first = len(records)
+	transactions.clear()
+	test_start = step_start = time.monotonic()
+	if MB_REPORT and step_output is None:
+		console = sys.stdout
+		step_output = io.StringIO()
+		sys.stdout = step_output
+
+
+
+def release_output(show):
+	# Returns console output held since previous step, shows it if asked
+	if step_output is None:
+		return ''
+	
+	text = step_output.getvalue()
+	step_output.seek(0)
+	step_output.truncate()
+	if show:
+		console.write(text)
+	
+	return text
+
+
+
+def step(name, failed, errors=None, **fields):
+	# Records step result, returns 1 if step failed, 0 otherwise
+	global step_start
+	
+	if failed:
+		print(f'*** {test}: {name} FAILED ***')
+	
+	now = time.monotonic()
+	record = {	'test': test,
+				'step': name,
+				'ok': not failed,
+				'time': round(now - test_start, 6),
+				'duration': round(now - step_start, 6)}
+	if errors is not None:
+		record['counters'] = errors.as_dict()
+	record.update(fields)
+	text = release_output(failed)
+	if failed:
+		record['output'] = text
+	records.append(record)
+	step_start = now
+	
+	return int(bool(failed))
+
+
+
+def transaction(config_val, request_size, response_size, latency, ok, end):
+	# latency - status wait time, end - mb_bsp clock time at the end of
+	# transaction, both in seconds
+	if test is not None and mb_results.MB_RESULTS:
+		transactions.append({	'test': test,
+								'config': config_val,
+								'request_size': request_size,
+								'response_size': response_size,
+								'latency': latency,
+								'ok': ok,
+								'time': end})
+
+
+
+def end(result_ok, **fields):
+	# Records test verdict, restores console output, writes files
+	global test, step_output
+	
+	if test is None:
+		return
+	
+	steps = records[test_first:]
+	failures = sum(not record['ok'] for record in steps)
+	record = {	'test': test,
+				'ok': bool(result_ok),
+				'time': round(time.monotonic() - test_start, 6),
+				'steps': len(steps),
+				'failures': failures}
+	record.update(fields)
+	text = release_output(not result_ok)
+	if not result_ok:
+		record['output'] = text
+	records.append(record)
+	
+	if mb_results.MB_RESULTS:
+		mb_results.store(records[test_first:], transactions)
+		transactions.clear()
+	
+	if step_output is not None:
+		sys.stdout = console
+		step_output = None
+		print(f'{test}: {len(steps)} steps, {failures} failed, {record["time"]:.3f} s')
+		write(MB_REPORT)
+	
+	test = None
+
+
+
+def write(prefix):
+	directory = os.path.dirname(prefix)
+	if directory:
+		os.makedirs(directory, exist_ok=True)
+	
+	with open(prefix + '.jsonl', 'w') as f:
+		f.writelines(json.dumps(record, default=str) + '\n' for record in records)
+	
+	ET.ElementTree(junit_xml(records)).write(prefix + '.xml', encoding='utf-8', xml_declaration=True)
+
+
+
+def junit_xml(records):
+	# testsuite per test, testcase per step; test verdict is a testcase
+	# too if test has no steps or fails without failed steps
+	suites = ET.Element('testsuites')
+	for verdict in (record for record in records if 'step' not in record):
+		steps = [record for record in records if record['test'] == verdict['test'] and 'step' in record]
+		cases = list(steps)
+		if not steps or (not verdict['ok'] and all(record['ok'] for record in steps)):
+			cases.append(dict(verdict, step=verdict['test'], duration=verdict['time']))
+		suite = ET.SubElement(	suites, 'testsuite', name=verdict['test'],
+								tests=str(len(cases)), time=f'{verdict["time"]:.6f}')
+		failures = 0
+		for record in cases:
+			case = ET.SubElement(	suite, 'testcase', classname=verdict['test'], name=record['step'],
+									time=f'{record["duration"]:.6f}')
+			if not record['ok']:
+				failures += 1
+				failure = ET.SubElement(case, 'failure', message=f'{record["step"]} failed')
+				failure.text = record.get('output', '')
+		suite.set('failures', str(failures))
+	
+	return suites
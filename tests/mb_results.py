@@ -0,0 +1,297 @@
+# MIT License
+
+# Copyright (c) 2021 Vasily Denisenko, Sergey Kuznetsov
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+# SQLite store of test results for regression tracking. With MB_RESULTS set
+# to a database file, every test run (process) is stored as a run keyed by
+# git revision of modbus_rtu_slave.sv, BAUD_DIV_*/DE_TIME parameters, backend
+# and instance, with test verdicts, step error counter deltas and latency of
+# every master transaction (mb_util.transaction and send_request), e.g.:
+#	MB_BSP_BACKEND=model MB_RESULTS=mb_results.db python mb_test_suite.py
+#
+# Trends and regression gate:
+#	python mb_results.py trend [baud_code [runs]]
+#	python mb_results.py gate [threshold [runs]]
+# Gate compares p99 latency and throughput (successful transactions per
+# second of mb_bsp clock time the tests spent at a baud code, from the start
+# of the first transaction to the end of the last one) of the last run with the median of previous runs of the same backend
+# and parameters, per baud code, and fails on drift beyond threshold, on a
+# baud code the previous runs have and the last run has no transactions at,
+# and on a last run without successful transactions.
+
+
+
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+from statistics import median
+
+
+
+MB_RESULTS = os.environ.get('MB_RESULTS', '')		# database file, '' - disabled
+
+RTL_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'modbus_rtu_slave.sv')
+
+TREND_RUNS = 50
+GATE_THRESHOLD = 0.1
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+	id INTEGER PRIMARY KEY,
+	started TEXT NOT NULL,
+	rtl_revision TEXT,
+	baud_div_def INTEGER,
+	baud_div_opt1 INTEGER,
+	baud_div_opt2 INTEGER,
+	de_time INTEGER,
+	backend TEXT,
+	instance INTEGER);
+CREATE TABLE IF NOT EXISTS tests (
+	run_id INTEGER REFERENCES runs (id),
+	test TEXT,
+	ok INTEGER,
+	time REAL,
+	steps INTEGER,
+	failures INTEGER,
+	timeouts INTEGER);
+CREATE TABLE IF NOT EXISTS steps (
+	run_id INTEGER REFERENCES runs (id),
+	test TEXT,
+	step TEXT,
+	ok INTEGER,
+	duration REAL,
+	errors INTEGER,
+	counters TEXT,
+	fields TEXT);
+CREATE TABLE IF NOT EXISTS transactions (
+	run_id INTEGER REFERENCES runs (id),
+	test TEXT,
+	config INTEGER,
+	baud_code INTEGER,
+	request_size INTEGER,
+	response_size INTEGER,
+	latency REAL,
+	ok INTEGER,
+	time REAL);
+CREATE INDEX IF NOT EXISTS runs_key ON runs (backend, baud_div_def, baud_div_opt1, baud_div_opt2, de_time);
+CREATE INDEX IF NOT EXISTS tests_run ON tests (run_id, test);
+CREATE INDEX IF NOT EXISTS steps_run ON steps (run_id, test);
+CREATE INDEX IF NOT EXISTS transactions_baud ON transactions (baud_code, run_id);
+'''
+
+run_id = None		# run of this process
+
+
+
+def connect(path):
+	db = sqlite3.connect(path)
+	db.executescript(SCHEMA)
+	
+	# Databases created before transaction end times were stored
+	if 'time' not in [column[1] for column in db.execute('PRAGMA table_info(transactions)')]:
+		db.execute('ALTER TABLE transactions ADD COLUMN time REAL')
+	
+	return db
+
+
+
+def rtl_revision():
+	# Last commit of modbus_rtu_slave.sv, '-dirty' if it has changes
+	directory = os.path.dirname(RTL_FILE)
+	try:
+		revision = subprocess.run(	['git', 'log', '-1', '--format=%h', '--', RTL_FILE], cwd=directory,
+									capture_output=True, text=True, check=True).stdout.strip()
+		dirty = subprocess.run(['git', 'diff', '--quiet', 'HEAD', '--', RTL_FILE], cwd=directory).returncode
+	except (OSError, subprocess.CalledProcessError):
+		return None
+	
+	return revision + ('-dirty' if dirty else '') if revision else None
+
+
+
+def new_run(db):
+	import mb_bsp
+	import mb_util
+	
+	cursor = db.execute(	'INSERT INTO runs (started, rtl_revision, baud_div_def, baud_div_opt1, baud_div_opt2, '
+							'de_time, backend, instance) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+							(	time.strftime('%Y-%m-%d %H:%M:%S'), rtl_revision(),
+								mb_util.MB_BAUD_DIV_DEF, mb_util.MB_BAUD_DIV_OPT1, mb_util.MB_BAUD_DIV_OPT2,
+								mb_util.MB_DE_TIME, mb_bsp.MB_BSP_BACKEND, mb_bsp.MB_BSP_INSTANCE))
+	
+	return cursor.lastrowid
+
+
+
+def store(records, transactions):
+	# Stores mb_report records (steps and verdict) and transactions of a test
+	global run_id
+	
+	db = connect(MB_RESULTS)
+	try:
+		with db:
+			if run_id is None:
+				run_id = new_run(db)
+			
+			for record in records:
+				if 'step' in record:
+					fields = {	key: value for key, value in record.items()
+								if key not in ('test', 'step', 'ok', 'time', 'duration', 'counters', 'output')}
+					counters = record.get('counters')
+					db.execute(	'INSERT INTO steps VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+								(	run_id, record['test'], record['step'], record['ok'], record['duration'],
+									sum(counters.values()) if counters else None,
+									json.dumps(counters) if counters else None,
+									json.dumps(fields, default=str)))
+				else:
+					db.execute(	'INSERT INTO tests VALUES (?, ?, ?, ?, ?, ?, ?)',
+								(	run_id, record['test'], record['ok'], record['time'], record['steps'],
+									record['failures'], record.get('timeouts')))
+			
+			db.executemany(	'INSERT INTO transactions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+							[	(	run_id, t['test'], t['config'], t['config'] & 0x3, t['request_size'],
+									t['response_size'], t['latency'], t['ok'], t['time'])
+								for t in transactions])
+	finally:
+		db.close()
+
+
+
+def percentile(sorted_values, pct):
+	# Nearest-rank percentile, pct in [0, 100]
+	rank = max(1, -(-len(sorted_values) * pct // 100))
+	return sorted_values[rank - 1]
+
+
+
+def throughput(db, baud_code, run):
+	# Successful transactions per second of the time spans the tests of
+	# the run spent at baud code, None for runs stored without end times
+	spans = db.execute(	'SELECT MAX(time) - MIN(time - latency), SUM(ok) FROM transactions '
+						'WHERE baud_code = ? AND run_id = ? GROUP BY test', (baud_code, run)).fetchall()
+	if any(span is None for span, count in spans):
+		return None
+	
+	duration = sum(span for span, count in spans)
+	
+	return sum(count for span, count in spans) / duration if duration > 0 else 0
+
+
+
+def latency_stats(db, baud_code, runs=TREND_RUNS, run_key=None):
+	# Per run of the last runs with successful transactions at baud code:
+	# (run id, started, revision, count, p50, p99, throughput), oldest first.
+	# run_key - (backend, baud_div_def, baud_div_opt1, baud_div_opt2, de_time)
+	query = (	'SELECT id, started, rtl_revision FROM runs WHERE id IN '
+				'(SELECT run_id FROM transactions WHERE baud_code = ? AND ok)')
+	args = [baud_code]
+	if run_key is not None:
+		query += ' AND backend = ? AND baud_div_def = ? AND baud_div_opt1 = ? AND baud_div_opt2 = ? AND de_time = ?'
+		args += run_key
+	query += ' ORDER BY id DESC LIMIT ?'
+	args.append(runs)
+	
+	stats = list()
+	for run, started, revision in reversed(db.execute(query, args).fetchall()):
+		latency = [row[0] for row in db.execute(	'SELECT latency FROM transactions '
+													'WHERE baud_code = ? AND run_id = ? AND ok ORDER BY latency',
+													(baud_code, run))]
+		stats.append((	run, started, revision, len(latency), percentile(latency, 50),
+						percentile(latency, 99), throughput(db, baud_code, run)))
+	
+	return stats
+
+
+
+def print_trend(db, baud_code, runs=TREND_RUNS):
+	print()
+	print(f'*** Transaction latency trend, baud code {baud_code} ***')
+	print(f'{"run":>6}  {"started":<20}{"revision":<16}{"count":>7}{"p50 ms":>10}{"p99 ms":>10}{"trans/s":>10}')
+	for run, started, revision, count, p50, p99, rate in latency_stats(db, baud_code, runs):
+		print(	f'{run:>6}  {started:<20}{revision or "-":<16}{count:>7}{p50 * 1e3:>10.3f}'
+				f'{p99 * 1e3:>10.3f}' + (f'{rate:>10.1f}' if rate is not None else f'{"-":>10}'))
+
+
+
+def gate(db, threshold=GATE_THRESHOLD, runs=TREND_RUNS):
+	# Returns 1 if the last run's p99 latency and throughput are within
+	# threshold of the previous runs' medians for every baud code, 0 on
+	# drift and on missing transactions of the last run
+	last = db.execute(	'SELECT id, backend, baud_div_def, baud_div_opt1, baud_div_opt2, de_time '
+						'FROM runs ORDER BY id DESC LIMIT 1').fetchone()
+	if last is None:
+		print('No runs stored')
+		return 1
+	
+	result_ok = 1
+	measured = 0
+	print()
+	print(f'*** Regression gate: run {last[0]}, threshold {threshold * 100:.0f} % ***')
+	for baud_code in range(4):
+		stats = latency_stats(db, baud_code, runs + 1, last[1:])
+		if not stats:
+			continue
+		if stats[-1][0] != last[0]:
+			print(f'baud code {baud_code}: no transactions in the last run - REGRESSION')
+			result_ok = 0
+			continue
+		measured += 1
+		if len(stats) < 2:
+			print(f'baud code {baud_code}: no previous runs')
+			continue
+		
+		# Runs stored without end times have no throughput
+		p99 = stats[-1][5]
+		rate = stats[-1][6]
+		ref_p99 = median(stat[5] for stat in stats[:-1])
+		ref_rates = [stat[6] for stat in stats[:-1] if stat[6] is not None]
+		drift_ok = p99 <= ref_p99 * (1 + threshold)
+		message = f'baud code {baud_code}: p99 {p99 * 1e3:.3f} ms (median {ref_p99 * 1e3:.3f})'
+		if rate is not None and ref_rates:
+			ref_rate = median(ref_rates)
+			drift_ok &= rate >= ref_rate * (1 - threshold)
+			message += f', throughput {rate:.1f}/s (median {ref_rate:.1f})'
+		print(message + f' - {"ok" if drift_ok else "REGRESSION"}')
+		result_ok &= drift_ok
+	
+	if not measured:
+		print('No successful transactions in the last run - REGRESSION')
+		result_ok = 0
+	
+	return result_ok
+
+
+
+if __name__ == '__main__':
+	db = connect(MB_RESULTS or 'mb_results.db')
+	command = sys.argv[1] if len(sys.argv) > 1 else 'trend'
+	if command == 'trend':
+		print_trend(	db, int(sys.argv[2]) if len(sys.argv) > 2 else 3,
+						int(sys.argv[3]) if len(sys.argv) > 3 else TREND_RUNS)
+	elif command == 'gate':
+		sys.exit(0 if gate(	db, float(sys.argv[2]) if len(sys.argv) > 2 else GATE_THRESHOLD,
+							int(sys.argv[3]) if len(sys.argv) > 3 else TREND_RUNS) else 1)
+	else:
+		sys.exit('Usage: mb_results.py trend [baud_code [runs]] | gate [threshold [runs]]')
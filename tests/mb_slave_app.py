@@ -0,0 +1,349 @@
+# MIT License
+
+# Copyright (c) 2021 Vasily Denisenko, Sergey Kuznetsov
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Reference Modbus application layer of the slave's MCU: holding registers
+# served by 0x03, 0x06 and 0x10 function codes through modbus_rtu_slave
+# Control/status and PDU interfaces.
+#
+# MCU polls control_pdu (poll) or calls serve on control_pdu interrupt.
+# Request PDU is read through the PDU interface (4 PDU bytes per word),
+# response PDU is built in a preallocated buffer and written back, then
+# PDU size and Control/status registers are written.
+#
+# Registers are array('H') of 65536 entries kept in Modbus (big-endian)
+# byte order, so register values are copied between PDUs and registers
+# without conversion; use read_regs/write_regs for their values.
+#
+# Encoded 0x03 responses are staged by (fcode, address, regnum), so repeated
+# polling reads only copy staged words to the PDU interface. Register writes
+# (0x06, 0x10, write_regs) drop staged responses overlapping them, the least
+# recently used response is dropped when the cache is full.
+#
+# Run the script to measure turnaround (control_pdu to Control/status write)
+# and memory allocations per request on the slave model.
+
+
+
+import struct
+import sys
+import time
+from array import array
+from collections import OrderedDict
+
+
+
+PDU_SIZE_REG = 0
+CS_REG = 3
+
+MAX_PDU_SIZE = 253
+MAX_READ_REGNUM = 125
+MAX_WRITE_REGNUM = 123
+REG_NUM = 65536
+
+WORD_TYPECODE = 'I' if array('I').itemsize == 4 else 'L'
+
+REQUEST_STRUCT = struct.Struct('>BHH')		# fcode, address, regnum/regval
+EXCEPTION_STRUCT = struct.Struct('>BB')		# fcode | 0x80, exception code
+
+ILLEGAL_FUNCTION = 0x1
+ILLEGAL_DATA_VALUE = 0x3
+
+CACHE_SIZE = 256
+CACHE_BLOCK_SHIFT = 6		# invalidation lookup granularity: 64 registers
+
+
+
+class SlaveApp:
+	def __init__(self, read_cs, write_cs, read_pdu_words, write_pdu_words, cache_size=CACHE_SIZE):
+		# modbus_rtu_slave access functions:
+		#	read_cs(cs_reg), write_cs(cs_reg, wdata),
+		#	read_pdu_words(pdu_addr, wordnum) - array of words,
+		#	write_pdu_words(pdu_addr, words)
+		# cache_size - number of staged 0x03 responses, 0 - no cache
+		self.read_cs = read_cs
+		self.write_cs = write_cs
+		self.read_pdu_words = read_pdu_words
+		self.write_pdu_words = write_pdu_words
+		
+		self.regs = array('H', bytes(REG_NUM << 1))
+		self.reg_bytes = memoryview(self.regs).cast('B')
+		
+		# PDU buffers are a whole number of PDU interface words
+		self.request = bytearray(MAX_PDU_SIZE + 3)
+		self.response = bytearray(MAX_PDU_SIZE + 3)
+		self.request_view = memoryview(self.request)
+		self.response_view = memoryview(self.response)
+		self.response_words = self.response_view.cast(WORD_TYPECODE)
+		
+		# Staged 0x03 responses: (fcode, address, regnum) - (PDU size, PDU words)
+		# in least recently used first order, and keys of responses overlapping
+		# every block of registers
+		self.cache_size = cache_size
+		self.cache = OrderedDict()
+		self.cache_blocks = dict()
+		self.cache_hits = 0
+		self.cache_misses = 0
+		
+		self.serve_count = 0
+		self.turnaround_total = 0		# ns
+		self.turnaround_max = 0		# ns
+
+
+	def read_regs(self, addr, regnum):
+		return list(struct.unpack_from(f'>{regnum}H', self.reg_bytes, addr << 1))
+
+
+	def write_regs(self, addr, regval):
+		struct.pack_into(f'>{len(regval)}H', self.reg_bytes, addr << 1, *regval)
+		self.invalidate(addr, len(regval))
+
+
+	def cache_blocks_of(self, addr, regnum):
+		return range(addr >> CACHE_BLOCK_SHIFT, ((addr + regnum - 1) >> CACHE_BLOCK_SHIFT) + 1)
+
+
+	def stage(self, key, size, words):
+		if len(self.cache) >= self.cache_size:
+			self.unstage(next(iter(self.cache)))		# the least recently used one
+		
+		self.cache[key] = (size, array(WORD_TYPECODE, words))
+		for block in self.cache_blocks_of(key[1], key[2]):
+			self.cache_blocks.setdefault(block, set()).add(key)
+
+
+	def unstage(self, key):
+		del self.cache[key]
+		for block in self.cache_blocks_of(key[1], key[2]):
+			keys = self.cache_blocks[block]
+			keys.discard(key)
+			if not keys:
+				del self.cache_blocks[block]
+
+
+	def invalidate(self, addr, regnum):
+		# Drop staged responses overlapping written registers
+		if not self.cache:
+			return
+		
+		end = addr + regnum
+		for block in self.cache_blocks_of(addr, regnum):
+			keys = self.cache_blocks.get(block)
+			if keys:
+				for key in [key for key in keys if key[1] < end and addr < key[1] + key[2]]:
+					self.unstage(key)
+
+
+	def poll(self):
+		# Serve request if control_pdu is set, returns 1 if a request was served
+		if not self.read_cs(CS_REG) & 0x1:
+			return 0
+		
+		self.serve()
+		
+		return 1
+
+
+	def serve(self):
+		start = time.perf_counter_ns()
+		
+		request = self.request
+		pdu_size = self.read_cs(PDU_SIZE_REG)
+		if pdu_size > MAX_PDU_SIZE:
+			pdu_size = 0
+		wordnum = (pdu_size + 3) >> 2
+		words = self.read_pdu_words(0, wordnum)
+		if sys.byteorder == 'big':
+			words.byteswap()
+		request[:wordnum << 2] = words
+		
+		fcode = request[0]
+		key = None
+		staged = None
+		if fcode == 0x3 and pdu_size == REQUEST_STRUCT.size and self.cache_size:
+			key = REQUEST_STRUCT.unpack_from(request)
+			staged = self.cache.get(key)
+		
+		if staged is not None:
+			self.cache_hits += 1
+			self.cache.move_to_end(key)
+			size, words = staged
+		else:
+			size = self.process(fcode, pdu_size)
+			if size == 0:
+				EXCEPTION_STRUCT.pack_into(self.response, 0, fcode | 0x80, 
+							ILLEGAL_FUNCTION if fcode not in (0x3, 0x6, 0x10) else ILLEGAL_DATA_VALUE)
+				size = EXCEPTION_STRUCT.size
+			
+			wordnum = (size + 3) >> 2
+			if sys.byteorder == 'big':
+				words = array(WORD_TYPECODE, self.response[:wordnum << 2])
+				words.byteswap()
+			else:
+				words = self.response_words[:wordnum]
+			
+			if key is not None and size > EXCEPTION_STRUCT.size:
+				self.cache_misses += 1
+				self.stage(key, size, words)
+		
+		self.write_pdu_words(0, words)
+		self.write_cs(PDU_SIZE_REG, size)
+		self.write_cs(CS_REG, 0)
+		
+		turnaround = time.perf_counter_ns() - start
+		self.serve_count += 1
+		self.turnaround_total += turnaround
+		if turnaround > self.turnaround_max:
+			self.turnaround_max = turnaround
+
+
+	def process(self, fcode, pdu_size):
+		# Build response in response buffer, returns its size,
+		# 0 - exception response is needed
+		if pdu_size < REQUEST_STRUCT.size:
+			return 0
+		
+		fcode, addr, value = REQUEST_STRUCT.unpack_from(self.request)
+		if fcode == 0x3:
+			if 		pdu_size != 5 \
+				or 	not 1 <= value <= MAX_READ_REGNUM \
+				or 	addr + value > REG_NUM:
+				return 0
+			bytecount = value << 1
+			self.response[0] = fcode
+			self.response[1] = bytecount
+			self.response_view[2:2 + bytecount] = self.reg_bytes[addr << 1:(addr << 1) + bytecount]
+			return 2 + bytecount
+		
+		elif fcode == 0x6:
+			if pdu_size != 5:
+				return 0
+			self.reg_bytes[addr << 1:(addr << 1) + 2] = self.request_view[3:5]
+			self.invalidate(addr, 1)
+		
+		elif fcode == 0x10:
+			bytecount = value << 1
+			if		not 1 <= value <= MAX_WRITE_REGNUM \
+				or	addr + value > REG_NUM \
+				or	pdu_size != 6 + bytecount \
+				or	self.request[5] != bytecount:
+				return 0
+			self.reg_bytes[addr << 1:(addr << 1) + bytecount] = self.request_view[6:6 + bytecount]
+			self.invalidate(addr, value)
+		
+		else:
+			return 0
+		
+		# 0x06, 0x10 response repeats request header
+		self.response_view[:5] = self.request_view[:5]
+		
+		return 5
+
+
+	def print_stats(self):
+		if self.serve_count:
+			print(	'Requests: ', self.serve_count, '; turnaround: ',
+					f'mean {self.turnaround_total / self.serve_count / 1000:.1f} us, '
+					f'max {self.turnaround_max / 1000:.1f} us')
+		if self.cache_hits or self.cache_misses:
+			print('Staged 0x03 responses: ', self.cache_hits, ' hits, ', self.cache_misses, ' misses')
+
+
+
+class PduWindow:
+	# modbus_rtu_slave registers as plain memory, to measure the application
+	# layer alone. The request stays in the window, responses are written aside
+	def __init__(self, pdu):
+		self.cs = [0, 0, 0, 1]
+		self.response = array(WORD_TYPECODE, bytes(MAX_PDU_SIZE + 3))
+		self.load(pdu)
+
+
+	def load(self, pdu):
+		# Place next request in the window
+		self.pdu_size = len(pdu)
+		self.request = array(WORD_TYPECODE, bytes(pdu) + bytes(MAX_PDU_SIZE + 3 - len(pdu)))
+
+
+	def read_cs(self, cs_reg):
+		if cs_reg == PDU_SIZE_REG:
+			return self.pdu_size
+		
+		return self.cs[cs_reg]
+
+
+	def write_cs(self, cs_reg, wdata):
+		self.cs[cs_reg] = wdata
+
+
+	def read_pdu_words(self, pdu_addr, wordnum):
+		return self.request[pdu_addr:pdu_addr + wordnum]
+
+
+	def write_pdu_words(self, pdu_addr, words):
+		self.response[pdu_addr:pdu_addr + len(words)] = array(WORD_TYPECODE, words)
+
+
+
+def measure(request_num=100000):
+	import mb_util
+	import tracemalloc
+	
+	regval = list(range(MAX_WRITE_REGNUM))
+	
+	print()
+	print('*** Slave application layer turnaround ***')
+	print()
+	
+	for name, pdu, cache_size in [
+			('0x03, 125 registers', mb_util.generate_0x03_pdu(0, MAX_READ_REGNUM)[0], 0),
+			('0x03, 125 registers, staged', mb_util.generate_0x03_pdu(0, MAX_READ_REGNUM)[0], CACHE_SIZE),
+			('0x06', mb_util.generate_0x06_pdu(0, regval)[0], CACHE_SIZE),
+			('0x10, 123 registers', mb_util.generate_0x10_pdu(0, MAX_WRITE_REGNUM, regval)[0], CACHE_SIZE)]:
+		window = PduWindow(pdu)
+		app = SlaveApp(window.read_cs, window.write_cs, window.read_pdu_words, window.write_pdu_words, cache_size)
+		
+		for i in range(request_num):
+			window.cs[CS_REG] = 1
+			app.poll()
+		
+		print(name)
+		app.print_stats()
+		
+		# Memory held after requests and transient peak of one request
+		tracemalloc.start()
+		window.cs[CS_REG] = 1
+		app.poll()
+		tracemalloc.reset_peak()
+		held = tracemalloc.get_traced_memory()[0]
+		for i in range(1000):
+			window.cs[CS_REG] = 1
+			app.poll()
+		current, peak = tracemalloc.get_traced_memory()
+		tracemalloc.stop()
+		print('Memory held after 1000 requests: ', current - held, ' bytes; '
+				'transient peak: ', peak - held, ' bytes')
+		print()
+
+
+
+if __name__ == '__main__':
+	measure()
@@ -0,0 +1,153 @@
+# MIT License
+
+# Copyright (c) 2021 Vasily Denisenko, Sergey Kuznetsov
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# Test algorithm in script:
+
+# 1. Fill holding registers of the slave application layer, served through
+#	 a plain memory PDU window.
+
+# 2. Read an area by 0x03 twice.
+#		- Check that the second response is staged (cache hit).
+
+# 3. Write registers inside the area by 0x06 and 0x10, re-read the area
+#	 after each write.
+#		- Check that the staged response is dropped and the re-read returns
+#		  written values.
+
+# 4. Write registers outside the area in the same register block, re-read
+#	 the area.
+#		- Check that the staged response is kept (cache hit).
+
+# 5. Fill a 2-response cache with areas A and B, read A again, then read C.
+#		- Check that B (least recently used) is dropped and A stays staged.
+
+# 6. Display test result.
+
+
+
+import struct
+import sys
+from array import array
+
+import mb_report
+import mb_slave_app
+import mb_util
+
+
+
+AREA_ADDR = 0
+AREA_REGNUM = 10
+OTHER_ADDR = 20		# in the same register block as the area
+
+error_count = 0
+
+
+
+def read_area(app, window, addr, regnum):
+	# Serve 0x03 request, returns received register values
+	window.load(mb_util.generate_0x03_pdu(addr, regnum)[0])
+	window.cs[mb_slave_app.CS_REG] = 1
+	app.poll()
+	
+	words = array(mb_slave_app.WORD_TYPECODE, window.response)
+	if sys.byteorder == 'big':
+		words.byteswap()
+	response = words.tobytes()[:window.cs[mb_slave_app.PDU_SIZE_REG]]
+	if len(response) != 2 + (regnum << 1) or response[:2] != bytes([0x3, regnum << 1]):
+		return None
+	
+	return list(struct.unpack_from(f'>{regnum}H', response, 2))
+
+
+def write_regs(app, window, addr, regval):
+	# Serve 0x06 (one value) or 0x10 request
+	if len(regval) == 1:
+		pdu = mb_util.generate_0x06_pdu(addr, regval)[0]
+	else:
+		pdu = mb_util.generate_0x10_pdu(addr, len(regval), regval)[0]
+	window.load(pdu)
+	window.cs[mb_slave_app.CS_REG] = 1
+	app.poll()
+
+
+def check_read(name, app, window, addr, regnum, expected_hit):
+	# Read area and compare it with registers and expected cache hit,
+	# returns 1 if failed
+	global error_count;
+	
+	prev_error_count = error_count
+	prev_hits = app.cache_hits
+	regval = read_area(app, window, addr, regnum)
+	hit = app.cache_hits != prev_hits
+	
+	if regval != app.read_regs(addr, regnum):
+		print('*** Test FAILED: ', name, ': read ', regval, ' instead of ', app.read_regs(addr, regnum), ' ***')
+		error_count += 1
+	
+	if hit != expected_hit:
+		print('*** Test FAILED: ', name, ': response is ', 'staged' if hit else 'not staged', ' ***')
+		error_count += 1
+	
+	return mb_report.step(name, error_count != prev_error_count, addr=addr, regnum=regnum, hit=hit)
+
+
+
+def run_tests():
+	global error_count;
+	
+	error_count = 0
+	
+	mb_report.begin('slave_app')
+	print()
+	print('*** Start slave application test ***')
+	
+	window = mb_slave_app.PduWindow(b'')
+	app = mb_slave_app.SlaveApp(window.read_cs, window.write_cs, window.read_pdu_words, window.write_pdu_words)
+	app.write_regs(0, list(range(0x100, 0x100 + 2 * OTHER_ADDR)))
+	
+	check_read('first_read', app, window, AREA_ADDR, AREA_REGNUM, False)
+	check_read('repeated_read', app, window, AREA_ADDR, AREA_REGNUM, True)
+	
+	write_regs(app, window, AREA_ADDR + 5, [0x1234])
+	check_read('read_after_0x06', app, window, AREA_ADDR, AREA_REGNUM, False)
+	
+	write_regs(app, window, AREA_ADDR + AREA_REGNUM - 2, [0xA5A5, 0x5A5A, 0xFFFF])
+	check_read('read_after_0x10', app, window, AREA_ADDR, AREA_REGNUM, False)
+	
+	write_regs(app, window, OTHER_ADDR, [0x4321, 0x8765])
+	check_read('read_after_other_write', app, window, AREA_ADDR, AREA_REGNUM, True)
+	
+	# Least recently used response is dropped from a full cache
+	app = mb_slave_app.SlaveApp(window.read_cs, window.write_cs, window.read_pdu_words, window.write_pdu_words, 2)
+	for addr in (0, 100, 0, 200):
+		read_area(app, window, addr, AREA_REGNUM)
+	check_read('recently_used_kept', app, window, 0, AREA_REGNUM, True)
+	check_read('least_recently_used_dropped', app, window, 100, AREA_REGNUM, False)
+	
+	result_ok = error_count == 0
+	mb_util.print_test_result(result_ok)
+	
+	return result_ok
+
+
+
+if __name__ == '__main__':
+	run_tests()
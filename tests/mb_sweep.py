@@ -0,0 +1,208 @@
+# MIT License
+
+# Copyright (c) 2021 Vasily Denisenko, Sergey Kuznetsov
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Configuration sweep: runs one transaction per cell of
+# (master config, slave config, fcode, regnum) matrix. Cells are
+# independent, so they are shared out among worker processes, each one with
+# its own test environment instance: a board selected by MB_BSP_INSTANCE or
+# a software model (MB_BSP_BACKEND=model). Results are merged into one report.
+#
+# Usage: python3 mb_sweep.py [workers]
+# Default number of workers is CPU number, with hardware it must not exceed
+# number of boards.
+#
+# Cell outcome:
+#		- ok: valid response is received, no errors are counted,
+#		- error: errors are counted or response is not valid,
+#		- timeout: master FSM status timeout.
+# Cells with equal master and slave configs must be ok, the other ones must not
+# (parity type is ignored when parity is disabled).
+
+
+
+import itertools
+import multiprocessing
+import os
+import sys
+import time
+from random import randrange
+
+
+
+# mb_bsp and mb_util are imported by workers only, after MB_BSP_INSTANCE is set
+mb_bsp = None
+mb_util = None
+
+SLAVE_ADDR = 1
+
+CONFIG_L = [(conf_bit << 8) | speed for speed in range(4) for conf_bit in range(8)]
+FCODE_L = [0x10]
+REGNUM_L = [None]		# None - maximum for fcode
+
+OUTCOMES = ['ok', 'error', 'timeout']
+
+
+
+def build_matrix(master_config_l=CONFIG_L, slave_config_l=CONFIG_L,
+					fcode_l=FCODE_L, regnum_l=REGNUM_L):
+	return [(i,) + cell for i, cell in enumerate(itertools.product(
+				master_config_l, slave_config_l, fcode_l, regnum_l))]
+
+
+
+def effective_config(config_val):
+	if not config_val & 0x100:
+		config_val &= ~0x200
+	
+	return config_val
+
+
+
+def init_worker(instance_q):
+	global mb_bsp, mb_util
+	
+	os.environ['MB_BSP_INSTANCE'] = str(instance_q.get())
+	import mb_bsp
+	import mb_util
+
+
+
+def run_cell(cell):
+	index, master_config, slave_config, fcode, regnum = cell
+	
+	if fcode == mb_util.FCODE_0x3:
+		if regnum is None:
+			regnum = mb_util.MB_MAX_READ_REGNUM
+		pdu_l = mb_util.generate_0x03_pdu(0, regnum)
+	elif fcode == mb_util.FCODE_0x6:
+		regnum = 1
+		pdu_l = mb_util.generate_0x06_pdu(0, [randrange(0, mb_util.MB_MAX_REG_VAL + 1)])
+	else:
+		if regnum is None:
+			regnum = mb_util.MB_MAX_WRITE_REGNUM
+		regval = [randrange(0, mb_util.MB_MAX_REG_VAL + 1) for i in range(regnum)]
+		pdu_l = mb_util.generate_0x10_pdu(0, regnum, regval)
+	
+	request_pdu = pdu_l[0]
+	ref_pdu = pdu_l[1]
+	
+	mb_util.get_error_delta()	# Error counters baseline
+	
+	# Quiet: configuration messages of workers are not of interest
+	stdout = sys.stdout
+	sys.stdout = open(os.devnull, 'w')
+	try:
+		mb_util.reset_err_count()
+		mb_util.config_modbus('Master', SLAVE_ADDR, request_pdu, master_config)
+		mb_util.config_modbus('Slave', SLAVE_ADDR, request_pdu, slave_config)
+		
+		mb_bsp.write_mb_master_cs(mb_util.CS_REG, 0)
+		result = mb_util.wait_status('Master', 'FSM status')
+		
+		response_ok = 0
+		if result.ok and mb_bsp.get_pdu_status('Master', 'PDU status'):
+			pdu_size = mb_bsp.read_mb_master_cs(mb_util.PDU_SIZE_REG)
+			response_pdu = mb_bsp.read_mb_master_pdu(pdu_size)
+			if fcode == mb_util.FCODE_0x3:
+				response_ok = 	bytes(ref_pdu[0:2]) == bytes(response_pdu[0:2]) \
+								and len(ref_pdu) == len(response_pdu)
+			else:
+				response_ok = bytes(ref_pdu) == bytes(response_pdu)
+	finally:
+		sys.stdout.close()
+		sys.stdout = stdout
+	
+	errors = mb_util.get_error_delta()
+	if not result.ok or mb_util.incr_err_count.count:
+		outcome = 'timeout'
+	elif response_ok and errors.total('Both') == 0:
+		outcome = 'ok'
+	else:
+		outcome = 'error'
+	
+	return (index, outcome, tuple(errors.count), os.getpid())
+
+
+
+def run_sweep(cells, workers=None):
+	if workers is None:
+		workers = os.cpu_count()
+	workers = min(workers, len(cells))
+	
+	print()
+	print('*** Configuration sweep: ', len(cells), ' cells, ', workers, ' workers ***')
+	
+	start = time.monotonic()
+	
+	# Spawned workers import mb_bsp from scratch with their own MB_BSP_INSTANCE
+	ctx = multiprocessing.get_context('spawn')
+	instance_q = ctx.Queue()
+	for i in range(workers):
+		instance_q.put(i)
+	
+	chunksize = max(1, len(cells) // (workers * 8))
+	with ctx.Pool(workers, initializer=init_worker, initargs=(instance_q,)) as pool:
+		results = sorted(pool.imap_unordered(run_cell, cells, chunksize))
+	
+	elapsed = time.monotonic() - start
+	
+	# Merge results
+	outcome_count = {(equal, outcome): 0 for equal in [True, False] for outcome in OUTCOMES}
+	unexpected = list()
+	for cell, (index, outcome, err_count, pid) in zip(cells, results):
+		equal = effective_config(cell[1]) == effective_config(cell[2])
+		outcome_count[(equal, outcome)] += 1
+		if (outcome == 'ok') != equal:
+			unexpected.append((cell, outcome, err_count))
+	
+	print()
+	print(f'{"configs":<10}' + ''.join(f'{outcome:>10}' for outcome in OUTCOMES))
+	for equal in [True, False]:
+		print(f'{"equal" if equal else "different":<10}' + 
+				''.join(f'{outcome_count[(equal, outcome)]:>10}' for outcome in OUTCOMES))
+	
+	if unexpected:
+		print()
+		print('Unexpected outcomes:')
+		print(f'{"master":>8}{"slave":>8}{"fcode":>7}{"regnum":>7}{"outcome":>9}  error counters')
+		for cell, outcome, err_count in unexpected:
+			index, master_config, slave_config, fcode, regnum = cell
+			print(	f'{master_config:>#8x}{slave_config:>#8x}{fcode:>#7x}{str(regnum):>7}'
+					f'{outcome:>9}  {list(err_count)}')
+	
+	print()
+	print('Workers: ', len(set(result[3] for result in results)), '; ',
+			f'{elapsed:.1f} sec, {len(cells) / elapsed:.1f} cells/sec')
+	
+	result_ok = not unexpected
+	
+	# Sweep is over, so the parent's own test environment connection is harmless
+	import mb_util
+	mb_util.print_test_result(result_ok)
+	
+	return result_ok
+
+
+
+if __name__ == '__main__':
+	workers = int(sys.argv[1]) if len(sys.argv) > 1 else None
+	sys.exit(0 if run_sweep(build_matrix(), workers) else 1)
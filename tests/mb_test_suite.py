@@ -0,0 +1,82 @@
+# MIT License
+
+# Copyright (c) 2021 Vasily Denisenko, Sergey Kuznetsov
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Test suite runner: runs test scripts as functions in one interpreter,
+# so BSP connection and CS registers shadow are shared by all of them.
+#
+# Usage: python3 mb_test_suite.py [test name ...]
+# Test names are keys of TESTS, all tests are run if none is given.
+
+
+
+import importlib
+import mb_util
+import sys
+import time
+
+
+
+# Test name: test script module
+TESTS = {	'interfaces': 	'mb_test_interfaces',
+			'norm_exch': 	'mb_norm_exch_test',
+			'crc': 			'mb_crc_tests',
+			'speed': 		'mb_speed_tests',
+			'parity': 		'mb_parity_tests',
+			'stop_bit': 	'mb_stop_bit_tests',
+			'slave_addr': 	'mb_slave_addr_tests',
+			'read_plan': 	'mb_read_plan_tests',
+			'transaction': 	'mb_transaction_tests',
+			'uart': 		'mb_uart_tests',
+			'scheduler': 	'mb_poll_scheduler_tests',
+			'slave_app': 	'mb_slave_app_tests'	}
+
+
+
+def run_suite(names=None):
+	if not names:
+		names = list(TESTS)
+	
+	unknown = [name for name in names if name not in TESTS]
+	if unknown:
+		raise ValueError('Unknown tests: ' + ', '.join(unknown) + \
+							'; available: ' + ', '.join(TESTS))
+	
+	results = list()
+	for name in names:
+		module = importlib.import_module(TESTS[name])
+		start = time.monotonic()
+		result_ok = module.run_tests()
+		results.append((name, result_ok, time.monotonic() - start))
+
+	print('*** Test suite results ***')
+	for name, result_ok, elapsed in results:
+		print('%-12s %-10s %8.3f s' % (name, 'Successful' if result_ok else 'FAILED', elapsed))
+	
+	result_ok = all(result[1] for result in results)
+	mb_util.print_test_result(result_ok)
+	
+	return result_ok
+
+
+
+if __name__ == '__main__':
+	sys.exit(0 if run_suite(sys.argv[1:]) else 1)
@@ -0,0 +1,211 @@
+# MIT License
+
+# Copyright (c) 2021 Vasily Denisenko, Sergey Kuznetsov
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+# Flight recorder of mb_bsp calls: fixed-size ring buffer of struct-packed
+# records (function, first two arguments, result, start time, duration),
+# dumped to a file on failure or timeout and decoded offline:
+#	python mb_trace.py mb_bsp_trace_crc_0.bin
+#
+# Arguments and results are recorded as numbers: integers as they are, role
+# and status strings as their index in ARG_STRINGS, sequences as their length.
+
+
+
+import struct
+import sys
+import time
+
+
+
+RECORD_STRUCT = struct.Struct('<QIBBHII')	# start [ns], duration [ns], function,
+											# flags, argument, value, result
+HEADER_STRUCT = struct.Struct('<4sHHI')		# magic, version, record size, record number
+MAGIC = b'MBTR'
+VERSION = 1
+
+ARG_STRINGS = ('Master', 'Slave', 'FSM status', 'PDU status', 'Both')
+
+# Record flags
+FLAG_EXCEPTION = 0x1
+FLAG_ARG_STR = 0x2
+FLAG_VALUE_STR = 0x4
+FLAG_RESULT_NONE = 0x8
+
+
+
+def encode(x):
+	# Returns (number, is string)
+	if isinstance(x, int):
+		return (x, 0)
+	if isinstance(x, str):
+		return (ARG_STRINGS.index(x) if x in ARG_STRINGS else 0xFFFF, 1)
+	if x is None:
+		return (0, 0)
+	try:
+		return (len(x), 0)
+	except TypeError:
+		return (0, 0)
+
+
+
+class FlightRecorder:
+	def __init__(self, record_num):
+		self.record_num = record_num
+		self.buf = bytearray(record_num * RECORD_STRUCT.size)
+		self.written = [0]		# records written, buffer keeps the last record_num ones
+		self.names = list()
+	
+	
+	@property
+	def count(self):
+		return self.written[0]
+	
+	
+	def wrap(self, func):
+		func_id = len(self.names)
+		self.names.append(func.__name__)
+		buf = self.buf
+		record_num = self.record_num
+		written = self.written
+		pack_into = RECORD_STRUCT.pack_into
+		record_size = RECORD_STRUCT.size
+		clock = time.monotonic_ns
+		
+		def record(start, end, flags, args, result):
+			# Integer arguments and results are recorded as they are, others
+			# are encoded
+			arg = args[0] if args else 0
+			if type(arg) is not int:
+				arg, is_str = encode(arg)
+				flags |= is_str and FLAG_ARG_STR
+			value = args[1] if len(args) > 1 else 0
+			if type(value) is not int:
+				value, is_str = encode(value)
+				flags |= is_str and FLAG_VALUE_STR
+			if result is None:
+				flags |= FLAG_RESULT_NONE
+				result = 0
+			elif type(result) is not int:
+				result = encode(result)[0]
+			duration = end - start
+			
+			i = written[0]
+			written[0] = i + 1
+			pack_into(	buf, (i % record_num) * record_size, start,
+						duration if duration < 0xFFFFFFFF else 0xFFFFFFFF,
+						func_id, flags, arg & 0xFFFF, value & 0xFFFFFFFF, result & 0xFFFFFFFF)
+		
+		def traced(*args):
+			start = clock()
+			try:
+				result = func(*args)
+			except BaseException:
+				record(start, clock(), FLAG_EXCEPTION, args, None)
+				raise
+			record(start, clock(), 0, args, result)
+			
+			return result
+		
+		traced.__name__ = func.__name__
+		traced.__wrapped__ = func
+		traced.__dict__ = func.__dict__		# function attributes are shared
+		
+		return traced
+	
+	
+	def install(self, namespace, names):
+		# Replaces functions of the namespace (module globals) with traced ones
+		for name in names:
+			namespace[name] = self.wrap(namespace[name])
+	
+	
+	def records(self):
+		# Recorded bytes, oldest record first
+		count = self.count
+		if count <= self.record_num:
+			return bytes(self.buf[:count * RECORD_STRUCT.size])
+		split = (self.count % self.record_num) * RECORD_STRUCT.size
+		
+		return bytes(self.buf[split:] + self.buf[:split])
+	
+	
+	def dump(self, file_name):
+		names = '\0'.join(self.names).encode()
+		records = self.records()
+		with open(file_name, 'wb') as f:
+			f.write(HEADER_STRUCT.pack(MAGIC, VERSION, RECORD_STRUCT.size, len(records) // RECORD_STRUCT.size))
+			f.write(struct.pack('<I', len(names)))
+			f.write(names)
+			f.write(records)
+
+
+
+def load(file_name):
+	# Returns (function names, list of records tuples)
+	with open(file_name, 'rb') as f:
+		data = f.read()
+	
+	magic, version, record_size, record_num = HEADER_STRUCT.unpack_from(data)
+	if magic != MAGIC or version != VERSION or record_size != RECORD_STRUCT.size:
+		raise ValueError(f'{file_name}: not an mb_bsp trace')
+	
+	pos = HEADER_STRUCT.size
+	names_size, = struct.unpack_from('<I', data, pos)
+	pos += 4
+	names = data[pos:pos + names_size].decode().split('\0')
+	pos += names_size
+	records = list(RECORD_STRUCT.iter_unpack(data[pos:pos + record_num * record_size]))
+	
+	return (names, records)
+
+
+
+def decode_number(x, is_str):
+	if is_str:
+		return repr(ARG_STRINGS[x]) if x < len(ARG_STRINGS) else '?'
+	
+	return f'{x:#x}'
+
+
+
+def print_trace(file_name):
+	names, records = load(file_name)
+	if not records:
+		print('Trace is empty')
+		return
+	
+	first = records[0][0]
+	print(f'{"time us":>12}{"dur us":>10}  {"function":<28}{"arg":>14}{"value":>14}{"result":>12}')
+	for start, duration, func_id, flags, arg, value, result in records:
+		print(	f'{(start - first) / 1e3:>12.1f}{duration / 1e3:>10.1f}  {names[func_id]:<28}'
+				f'{decode_number(arg, flags & FLAG_ARG_STR):>14}'
+				f'{decode_number(value, flags & FLAG_VALUE_STR):>14}'
+				f'{"-" if flags & FLAG_RESULT_NONE else f"{result:#x}":>12}'
+				f'{"  exception" if flags & FLAG_EXCEPTION else ""}')
+	print(len(records), ' records')
+
+
+
+if __name__ == '__main__':
+	for file_name in sys.argv[1:]:
+		print_trace(file_name)
@@ -0,0 +1,183 @@
+# MIT License
+
+# Copyright (c) 2021 Vasily Denisenko, Sergey Kuznetsov
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Modbus transactions benchmark: round trip latency percentiles and
+# throughput for 0x03/0x06/0x10 requests at all baud codes, parity and
+# stop bit settings and request/response PDU sizes from the smallest
+# to the largest one. Every transaction is split into phases:
+#		- config: master FSM ready wait, master and slave configuration,
+#		- pdu write: request PDU size and request PDU,
+#		- start: CS register write,
+#		- wait: master's PDU status wait,
+#		- read: response PDU size and response PDU.
+# Only mb_bsp and mb_util functions are used, so results of different
+# backends (MB_BSP_BACKEND) are comparable. "calc" column is the
+# mb_util.transaction_time estimate for the hardware parameters and the
+# backend's request processing time (mb_bsp.process_time, printed in the
+# header). Phases are timed by mb_bsp.clock: virtual time on the model by
+# default.
+
+
+
+import mb_bsp
+import mb_results
+import mb_util
+import sys
+from random import randrange
+
+
+
+BENCH_REPEAT = 10		# transactions per benchmark point
+
+# Register numbers per function code, from the smallest PDU to the largest one
+REGNUM_L = {	mb_util.FCODE_0x3: 	[1, 2, 8, 32, 64, mb_util.MB_MAX_READ_REGNUM],
+				mb_util.FCODE_0x6: 	[1],
+				mb_util.FCODE_0x10: [1, 2, 8, 32, 64, mb_util.MB_MAX_WRITE_REGNUM]	}
+
+PHASES = ['config', 'pdu write', 'start', 'wait', 'read']
+
+SLAVE_ADDR = 1
+
+
+
+def run_transaction(fcode, regnum, regval, config_val, phase_t):
+	# Do one transaction and append phase durations [sec] to phase_t lists.
+	# Return 1 if response is received
+	if fcode == mb_util.FCODE_0x3:
+		request_pdu = mb_util.generate_0x03_pdu(0, regnum)[0]
+	elif fcode == mb_util.FCODE_0x6:
+		request_pdu = mb_util.generate_0x06_pdu(0, regval)[0]
+	else:
+		request_pdu = mb_util.generate_0x10_pdu(0, regnum, regval)[0]
+	
+	clock = mb_bsp.clock
+	t0 = clock.monotonic()
+	mb_util.wait_status('Master', 'FSM status')
+	for modbus_role in ['Master', 'Slave']:
+		mb_util.write_cs(modbus_role, mb_util.CONFIG_REG, config_val)
+		mb_util.write_cs(modbus_role, mb_util.SLAVE_ADDR_REG, SLAVE_ADDR)
+	
+	t1 = clock.monotonic()
+	mb_util.write_cs('Master', mb_util.PDU_SIZE_REG, len(request_pdu))
+	mb_bsp.write_mb_master_pdu(request_pdu)
+	
+	t2 = clock.monotonic()
+	mb_bsp.write_mb_master_cs(mb_util.CS_REG, 0)
+	
+	t3 = clock.monotonic()
+	result = mb_util.wait_status('Master', 'PDU status')
+	
+	t4 = clock.monotonic()
+	if result.ok:
+		pdu_size = mb_bsp.read_mb_master_cs(mb_util.PDU_SIZE_REG)
+		mb_bsp.read_mb_master_pdu(pdu_size)
+	
+	t5 = clock.monotonic()
+	
+	for phase, t in zip(PHASES, [t1 - t0, t2 - t1, t3 - t2, t4 - t3, t5 - t4]):
+		phase_t[phase].append(t)
+	
+	return result.ok
+
+
+
+def run_bench(fcode_l=None, speed_l=None, conf_bit_l=None):
+	if fcode_l is None:
+		fcode_l = [mb_util.FCODE_0x3, mb_util.FCODE_0x6, mb_util.FCODE_0x10]
+	if speed_l is None:
+		speed_l = [i for i in range(4)]
+	if conf_bit_l is None:
+		conf_bit_l = [i for i in range(8)]
+	
+	process_time = mb_bsp.process_time
+	if process_time is None:
+		process_time = mb_util.MB_PROCESS_TIME
+	
+	print()
+	print('*** Modbus transactions benchmark ***')
+	print()
+	print(f'Backend: {mb_bsp.MB_BSP_BACKEND}; request processing time: {process_time * 1e3:.3f} ms')
+	print(f'{"fcode":>6}{"config":>8}{"regnum":>7}{"req":>5}{"resp":>5}'
+			f'{"calc ms":>10}{"p50 ms":>10}{"p90 ms":>10}{"p99 ms":>10}'
+			f'{"max ms":>10}{"trans/s":>10}{"fail":>6}')
+	
+	total_phase_t = {phase: list() for phase in PHASES}
+	total_count = 0
+	total_time = 0
+	fail_count = 0
+	
+	mb_util.get_error_delta()	# Error counters baseline
+	
+	for fcode in fcode_l:
+		for speed in speed_l:
+			for conf_bit in conf_bit_l:
+				config_val = (conf_bit << 8) | speed
+				for regnum in REGNUM_L[fcode]:
+					regval = [randrange(0, mb_util.MB_MAX_REG_VAL + 1) for i in range(regnum)]
+					phase_t = {phase: list() for phase in PHASES}
+					fail = 0
+					for i in range(BENCH_REPEAT):
+						if not run_transaction(fcode, regnum, regval, config_val, phase_t):
+							fail += 1
+					
+					latency = sorted(map(sum, zip(*phase_t.values())))
+					elapsed = sum(latency)
+					calc_time = mb_util.transaction_time(	config_val,
+															mb_util.request_pdu_size(fcode, regnum),
+															mb_util.response_pdu_size(fcode, regnum),
+															process_time)
+					print(	f'{fcode:>#6x}{config_val:>#8x}{regnum:>7}'
+							f'{mb_util.request_pdu_size(fcode, regnum):>5}{mb_util.response_pdu_size(fcode, regnum):>5}'
+							f'{calc_time * 1e3:>10.3f}'
+							f'{mb_results.percentile(latency, 50) * 1e3:>10.3f}'
+							f'{mb_results.percentile(latency, 90) * 1e3:>10.3f}'
+							f'{mb_results.percentile(latency, 99) * 1e3:>10.3f}'
+							f'{latency[-1] * 1e3:>10.3f}'
+							f'{len(latency) / elapsed:>10.1f}{fail:>6}')
+					
+					for phase in PHASES:
+						total_phase_t[phase] += phase_t[phase]
+					total_count += len(latency)
+					total_time += elapsed
+					fail_count += fail
+	
+	print()
+	print(f'{"phase":<12}{"p50 ms":>10}{"p90 ms":>10}{"p99 ms":>10}{"max ms":>10}{"share %":>9}')
+	for phase in PHASES:
+		t = sorted(total_phase_t[phase])
+		print(	f'{phase:<12}{mb_results.percentile(t, 50) * 1e3:>10.3f}'
+				f'{mb_results.percentile(t, 90) * 1e3:>10.3f}{mb_results.percentile(t, 99) * 1e3:>10.3f}'
+				f'{t[-1] * 1e3:>10.3f}{sum(t) / total_time * 100:>9.1f}')
+	
+	print()
+	print('Transactions: ', total_count, '; failed: ', fail_count, '; ',
+			f'{total_count / total_time:.1f} trans/s')
+	mb_util.print_error_count(mb_util.get_error_delta())
+	
+	return fail_count == 0
+
+
+
+if __name__ == '__main__':
+	# Optional arguments: function codes, e.g. 0x03 0x10
+	fcode_l = [int(arg, 0) for arg in sys.argv[1:]] or None
+	run_bench(fcode_l)
@@ -0,0 +1,150 @@
+# MIT License
+
+# Copyright (c) 2021 Vasily Denisenko, Sergey Kuznetsov
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+
+# Test algorithm in script (model backend):
+
+# 1. Do a 0x03 transaction with random slave address and configuration.
+
+# 2. Hold master's FSM busy and do a transaction with other slave address
+#	 and configuration: FSM status wait times out, CS writes are skipped.
+
+# 3. Release master's FSM and repeat the transaction.
+#		- Check response PDU's function code, byte count and size.
+#		- Check master's configuration and slave address registers.
+
+# 4. Display test result.
+
+
+
+import mb_bsp
+import mb_report
+import mb_util
+from random import randrange
+
+
+
+RAND_TEST_SIZE = 10
+
+error_count = 0
+
+
+
+def random_settings():
+	config_val = (randrange(0, 8) << 8) | randrange(0, 4)
+	return (randrange(1, mb_util.MB_MAX_SLAVE_ADDR + 1), config_val)
+
+
+
+def exchange(slave_addr, config_val, master=None):
+	# master - model's master FSM to hold busy during the transaction
+	mb_util.config_modbus('Slave', slave_addr, [], config_val)
+	request_pdu, ref_pdu = mb_util.generate_0x03_pdu(0, randrange(1, 10))
+	if master is not None:
+		master.busy = 1
+	result, response_pdu = mb_util.transaction(	slave_addr, request_pdu, config_val, len(ref_pdu),
+												expect_timeout=master is not None)
+	if master is not None:
+		master.busy = 0
+	
+	return (result, response_pdu, ref_pdu)
+
+
+
+def response_ok(result, response_pdu, ref_pdu):
+	# Register values are those left by previous tests: fcode, bytecount
+	# and size are checked
+	return	result.ok \
+			and len(response_pdu) == len(ref_pdu) \
+			and bytes(response_pdu[0:2]) == bytes(ref_pdu[0:2])
+
+
+
+def run_test_fsm_timeout(mb_bsp_model):
+	global error_count;
+	
+	slave_addr, config_val = random_settings()
+	result, response_pdu, ref_pdu = exchange(slave_addr, config_val)
+	if not response_ok(result, response_pdu, ref_pdu):
+		print('*** Test FAILED: Transaction failed ***')
+		error_count += 1
+		return
+	
+	while True:
+		new_settings = random_settings()
+		if new_settings != (slave_addr, config_val):
+			break
+	slave_addr, config_val = new_settings
+	print('address = ', slave_addr, '; config = ', hex(config_val))
+	
+	result, response_pdu, ref_pdu = exchange(slave_addr, config_val, mb_bsp_model.bench.master)
+	if result.ok:
+		print('*** Test FAILED: FSM status wait did not time out ***')
+		error_count += 1
+	
+	result, response_pdu, ref_pdu = exchange(slave_addr, config_val)
+	if not response_ok(result, response_pdu, ref_pdu):
+		print('*** Test FAILED: Transaction after timeout failed ***')
+		error_count += 1
+	
+	master_config_val = mb_bsp.read_mb_master_cs(mb_util.CONFIG_REG)
+	master_slave_addr = mb_bsp.read_mb_master_cs(mb_util.SLAVE_ADDR_REG)
+	if (master_slave_addr, master_config_val) != (slave_addr, config_val):
+		print('*** Test FAILED: Master CS registers are not valid ***')
+		print('address = ', master_slave_addr, '; config = ', hex(master_config_val))
+		error_count += 1
+
+
+
+def run_tests():
+	global error_count;
+	
+	mb_report.begin('transaction')
+	print()
+	print('*** Start transaction recovery test ***')
+	
+	if mb_bsp.MB_BSP_BACKEND != 'model':
+		print('Test needs the model backend (MB_BSP_BACKEND=model), test skipped')
+		return True
+	
+	import mb_bsp_model
+	
+	error_count = 0
+	mb_util.reset_err_count()
+	
+	for i in range(RAND_TEST_SIZE):
+		prev_error_count = error_count
+		run_test_fsm_timeout(mb_bsp_model)
+		mb_report.step('fsm_timeout', error_count != prev_error_count)
+	
+	print('Timeout error count = ', mb_util.incr_err_count.count)
+	
+	result_ok = error_count == 0 and mb_util.incr_err_count.count == 0
+	mb_util.print_test_result(result_ok)
+	
+	return result_ok
+
+
+
+if __name__ == '__main__':
+	run_tests()
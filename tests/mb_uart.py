@@ -0,0 +1,224 @@
+# MIT License
+
+# Copyright (c) 2021 Vasily Denisenko, Sergey Kuznetsov
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+# UART waveforms of Modbus RTU frames, vectorized with NumPy: a batch of
+# frames is turned into rxd/txd sample arrays (one frame per row) and sample
+# arrays are decoded back into bytes with the error pulses of the
+# modbus_rtu_slave receiver: parity, start bit and stop bit errors.
+#
+# Character framing is selected by the Configuration register value as in
+# the RTL: [8] parity enable, [9] odd parity, [10] two stop bits.
+# Decoder follows mb_model.uart_receive: it waits for a falling edge, samples
+# the start bit in its middle (start bit error if high, search resumes after
+# the sample), then data bits, parity and stop bits one bit period apart;
+# the first low stop bit gives a stop bit error.
+#
+# Decoding has no per-bit or per-character Python loop: all falling edges of
+# all frames are decoded at once and the receiver's path through them is found
+# in log2(characters) vectorized steps.
+#
+# Run the script to measure generation and decoding rates.
+
+
+
+import mb_util
+import sys
+import time
+
+import numpy as np
+
+
+
+IDLE_BITS = 2			# idle line before and after a frame, bit periods
+DECODE_CHUNK = 1 << 23	# samples decoded at once, bounds decoder's memory
+
+
+
+def frame_matrix(frames):
+	# Frames as 2D uint8 array (one frame per row, zero padded) and sizes
+	if isinstance(frames, np.ndarray):
+		data = frames.astype(np.uint8, copy=False)
+		return (data, np.full(data.shape[0], data.shape[1]))
+	
+	size = np.array([len(frame) for frame in frames], dtype=np.intp)
+	data = np.zeros((len(frames), size.max(initial=0)), dtype=np.uint8)
+	for i, frame in enumerate(frames):
+		data[i, :size[i]] = np.frombuffer(bytes(frame), dtype=np.uint8)
+	
+	return (data, size)
+
+
+
+def generate(frames, config_val, samples_per_bit, idle_bits=IDLE_BITS):
+	# Returns 2D uint8 array of line levels, one frame per row; shorter
+	# frames are followed by idle line
+	data, size = frame_matrix(frames)
+	parity_ena = (config_val >> 8) & 0x1
+	parity_type = (config_val >> 9) & 0x1
+	bit_num = mb_util.char_bits(config_val)
+	frame_num, char_num = data.shape
+	
+	bits = np.ones((frame_num, char_num, bit_num), dtype=np.uint8)
+	bits[:, :, 0] = 0
+	bits[:, :, 1:9] = (data[:, :, None] >> np.arange(8, dtype=np.uint8)) & 1
+	if parity_ena:
+		bits[:, :, 9] = (bits[:, :, 1:9].sum(axis=2, dtype=np.uint8) + parity_type) & 1
+	bits[np.arange(char_num) >= size[:, None]] = 1
+	
+	line = np.ones((frame_num, char_num * bit_num + 2 * idle_bits), dtype=np.uint8)
+	line[:, idle_bits:idle_bits + char_num * bit_num] = bits.reshape(frame_num, -1)
+	
+	return np.repeat(line, samples_per_bit, axis=1)
+
+
+
+def decode(samples, config_val, samples_per_bit):
+	# Returns received bytes (2D uint8 array, one frame per row), their
+	# numbers and [parity, start bit, stop bit] error pulse counts per row.
+	# samples_per_bit is the receiver's bit period, may differ from the
+	# transmitter's one and may be fractional
+	samples = np.asarray(samples, dtype=np.uint8)
+	if samples.ndim == 1:
+		samples = samples[None, :]
+	
+	rows = max(1, DECODE_CHUNK // max(samples.shape[1], 1))
+	results = [decode_chunk(samples[i:i + rows], config_val, samples_per_bit)
+				for i in range(0, samples.shape[0], rows)]
+	if len(results) == 1:
+		return results[0]
+	
+	width = max(result[0].shape[1] for result in results)
+	data = np.concatenate([np.pad(result[0], ((0, 0), (0, width - result[0].shape[1]))) for result in results])
+	
+	return (data, np.concatenate([result[1] for result in results]), np.concatenate([result[2] for result in results]))
+
+
+
+def decode_chunk(samples, config_val, samples_per_bit):
+	# Every falling edge is decoded as a character start at once; characters
+	# the receiver really takes are the chain from the first edge of a row,
+	# each character followed by the next edge after its last sample. The
+	# chain is found by binary lifting over successor links
+	parity_ena = (config_val >> 8) & 0x1
+	parity_type = (config_val >> 9) & 0x1
+	frame_num, length = samples.shape
+	
+	# Sample offsets from the falling edge: start bit, data bits, parity, stop bits
+	bit_num = mb_util.char_bits(config_val)
+	offsets = np.floor((np.arange(bit_num) + 0.5) * samples_per_bit).astype(np.intp)
+	stop_first = 9 + parity_ena
+	
+	# Falling edges as sorted flat indices (row * length + sample), the line
+	# is idle before the first sample
+	falling = np.empty((frame_num, length), dtype=bool)
+	falling[:, 0] = samples[:, 0] == 0
+	falling[:, 1:] = samples[:, 1:] < samples[:, :-1]
+	edges = np.flatnonzero(falling)
+	edge_num = len(edges)
+	row = edges // length
+	col = edges - row * length
+	
+	# Samples followed by idle line up to the last sample point of a character
+	stride = length + int(offsets[-1]) + 1
+	line = np.ones((frame_num, stride), dtype=np.uint8)
+	line[:, :length] = samples
+	line = line.reshape(-1)
+	base = row * stride + col
+	
+	def levels(edge, offset):
+		# Line levels at sample points of edges
+		return line[base[edge, None] + offset]
+	
+	# Start and stop bits of every edge decide where the receiver resumes
+	# search: after the start bit sample on start bit error, after the first
+	# low stop bit sample or the last stop bit sample
+	every = slice(None)
+	start_err = levels(every, offsets[:1])[:, 0] == 1
+	stop = levels(every, offsets[stop_first:]) == 0
+	stop_err = ~start_err & stop.any(axis=1)
+	last = np.where(stop_err, stop_first + stop.argmax(axis=1), bit_num - 1)
+	last[start_err] = 0
+	resume = np.minimum(col + offsets[last] + 1, length)
+	
+	# Successor: next edge of the same row, edge_num - none
+	succ = np.searchsorted(edges, row * length + resume)
+	succ[edges[np.minimum(succ, edge_num - 1)] >= (row + 1) * length] = edge_num
+	succ[succ >= edge_num] = edge_num
+	
+	# Jump tables succ^(2^k) with the sentinel, until no jump is left
+	jumps = [np.append(succ, edge_num)]
+	while (jumps[-1][:edge_num] < edge_num).any():
+		jumps.append(jumps[-1][jumps[-1]])
+	
+	# Last chain node at or before every edge, starting from the row's first edge
+	index = np.arange(edge_num)
+	row_first = np.empty(edge_num, dtype=bool)
+	row_first[:1] = True
+	row_first[1:] = row[1:] != row[:-1]
+	node = np.maximum.accumulate(np.where(row_first, index, 0))
+	for jump in reversed(jumps):
+		next_node = jump[node]
+		node = np.where(next_node <= index, next_node, node)
+	taken = node == index
+	
+	received = np.flatnonzero(taken & ~start_err)
+	received_row = row[received]
+	level = levels(received, offsets[1:9 + parity_ena])
+	byte = (level[:, :8] << np.arange(8, dtype=np.uint8)).sum(axis=1, dtype=np.intp)
+	parity_err = np.zeros(edge_num, dtype=bool)
+	if parity_ena:
+		parity_err[received] = ((level[:, :8].sum(axis=1) + parity_type) & 1) != level[:, 8]
+	
+	err_count = np.stack([	np.bincount(row[parity_err], minlength=frame_num),
+							np.bincount(row[taken & start_err], minlength=frame_num),
+							np.bincount(row[taken & stop_err], minlength=frame_num)], axis=1)
+	
+	size = np.bincount(received_row, minlength=frame_num)
+	data = np.zeros((frame_num, max(int(size.max(initial=0)), 1)), dtype=np.uint8)
+	first = np.searchsorted(received_row, np.arange(frame_num))
+	data[received_row, np.arange(len(received)) - first[received_row]] = byte
+	
+	return (data, size, err_count)
+
+
+
+def measure(frame_num=1000, frame_size=256, samples_per_bit=16):
+	frames = np.random.randint(0, 256, (frame_num, frame_size), dtype=np.uint8)
+	char_num = frame_num * frame_size
+	print(f'{frame_num} frames of {frame_size} bytes, {samples_per_bit} samples per bit')
+	print(f'{"config":>8}{"generate Mchar/s":>19}{"decode Mchar/s":>17}{"errors":>8}')
+	for config_val in [0x0, 0x100, 0x300, 0x400, 0x500]:
+		start = time.perf_counter()
+		samples = generate(frames, config_val, samples_per_bit)
+		generated = time.perf_counter()
+		data, size, err_count = decode(samples, config_val, samples_per_bit)
+		decoded = time.perf_counter()
+		
+		errors = int(err_count.sum()) + int((data[:, :frame_size] != frames).sum())
+		print(	f'{config_val:>#8x}{char_num / (generated - start) / 1e6:>19.2f}'
+				f'{char_num / (decoded - generated) / 1e6:>17.2f}{errors:>8}')
+
+
+
+if __name__ == '__main__':
+	measure(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,152 @@
+# MIT License
+
+# Copyright (c) 2021 Vasily Denisenko, Sergey Kuznetsov
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+
+# Test algorithm in script:
+
+# 1. Select random transmitter and receiver configurations (speed, parity,
+#	 stop bits), equal ones included.
+
+# 2. Generate UART waveforms of a batch of random frames by mb_uart.generate
+#	 with the transmitter's bit period.
+
+# 3. Decode waveforms by mb_uart.decode with the receiver's bit period.
+#		- Check received bytes and parity, start bit and stop bit error counts
+#		  of every frame against mb_model.uart_receive.
+
+# 4. Decode fixed waveforms of 0x55 byte at 16 samples per bit with a
+#	 flipped parity bit, a low stop bit and a start bit glitch in the idle
+#	 line before the frame.
+#		- Check received bytes and error counts against expected ones.
+
+# 5. Display test result.
+
+
+
+import mb_util
+import mb_model
+import mb_report
+from random import randrange
+
+try:
+	import mb_uart
+except ImportError:
+	mb_uart = None
+
+
+
+RAND_TEST_SIZE = 20
+FRAME_NUM = 8
+MAX_FRAME_SIZE = 8
+
+# Fixed waveforms: name, config value, frame, samples set to level
+# (first, last + 1, level), expected bytes and [parity, start bit, stop bit]
+# error counts. Frames start after 2 idle bits, 16 samples per bit
+VECTOR_SAMPLES_PER_BIT = 16
+VECTORS = [	('parity_bit', 	0x100, b'\x55', (176, 192, 1), b'\x55', [1, 0, 0]),	# even parity bit 0 -> 1
+			('stop_bit', 	0x000, b'\x55', (176, 192, 0), b'\x55', [0, 0, 1]),	# stop bit 1 -> 0
+			('start_bit', 	0x000, b'\x55', (4, 8, 0), b'\x55', [0, 1, 0])	]	# 4-sample low glitch
+
+error_count = 0
+
+
+
+def random_config():
+	return (randrange(0, 8) << 8) | randrange(0, 4)
+
+
+
+def run_test_uart(tx_config, rx_config):
+	global error_count;
+	
+	prev_error_count = error_count
+	frames = [bytes(randrange(0, 256) for i in range(randrange(1, MAX_FRAME_SIZE + 1)))
+				for j in range(FRAME_NUM)]
+	samples = mb_uart.generate(frames, tx_config, mb_util.baud_divisor(tx_config & 0x3))
+	data, size, err_count = mb_uart.decode(samples, rx_config, mb_util.baud_divisor(rx_config & 0x3))
+	
+	for i, frame in enumerate(frames):
+		ref_data, ref_err_count = mb_model.uart_receive(frame, tx_config, rx_config)
+		received = bytes(data[i, :size[i]])
+		if received != ref_data or err_count[i].tolist() != ref_err_count:
+			print('*** Test FAILED: Decoded frame is not valid ***')
+			print('frame = ', frame.hex())
+			print('received = ', received.hex(), '; err_count = ', err_count[i].tolist())
+			print('reference = ', ref_data.hex(), '; err_count = ', ref_err_count)
+			error_count += 1
+	
+	mb_report.step('uart_receive', error_count != prev_error_count, tx_config=tx_config, rx_config=rx_config)
+
+
+
+def run_test_vector(name, config_val, frame, edit, ref_data, ref_err_count):
+	global error_count;
+	
+	prev_error_count = error_count
+	samples = mb_uart.generate([frame], config_val, VECTOR_SAMPLES_PER_BIT)
+	first, last, level = edit
+	samples[0, first:last] = level
+	data, size, err_count = mb_uart.decode(samples, config_val, VECTOR_SAMPLES_PER_BIT)
+	
+	received = bytes(data[0, :size[0]])
+	print(name, ': received = ', received.hex(), '; err_count = ', err_count[0].tolist())
+	if received != ref_data or err_count[0].tolist() != ref_err_count:
+		print('*** Test FAILED: Decoded frame is not valid ***')
+		print('expected = ', ref_data.hex(), '; err_count = ', ref_err_count)
+		error_count += 1
+	
+	mb_report.step(name, error_count != prev_error_count, config=config_val)
+
+
+
+def run_tests():
+	global error_count;
+	
+	mb_report.begin('uart')
+	print()
+	print('*** Start UART waveform test ***')
+	
+	if mb_uart is None:
+		print('NumPy is not installed, test skipped')
+		return True
+	
+	error_count = 0
+	
+	configs = [(config_val, config_val) for config_val in [random_config() for i in range(RAND_TEST_SIZE // 2)]]
+	configs += [(random_config(), random_config()) for i in range(RAND_TEST_SIZE - len(configs))]
+	for tx_config, rx_config in configs:
+		print('tx_config = ', hex(tx_config), '; rx_config = ', hex(rx_config))
+		run_test_uart(tx_config, rx_config)
+	
+	for vector in VECTORS:
+		run_test_vector(*vector)
+	
+	result_ok = error_count == 0
+	mb_util.print_test_result(result_ok)
+	
+	return result_ok
+
+
+
+if __name__ == '__main__':
+	run_tests()
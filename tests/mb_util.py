@@ -23,6 +23,18 @@
 
 
 import mb_bsp
+import mb_profile
+import mb_report
+import struct
+import sys
+from array import array
+from collections import namedtuple
+from random import randrange
+
+try:
+	import numpy as np
+except ImportError:
+	np = None
 
 
 
@@ -39,11 +51,32 @@ MB_MAX_SLAVE_ADDR = 247
 MB_MIN_SLAVE_ADDR = 1
 MB_MAX_PDU_SIZE = 253
 MB_MIN_PDU_SIZE = 1
+MB_MAX_PDU_WORDNUM = 64		# PDU interface window, 4 PDU bytes per word
 
 FCODE_0x3 = 0x3
 FCODE_0x6 = 0x6
 FCODE_0x10 = 0x10
 
+MB_CONFIG_MASK = (0x7 << 8) | 0x3
+
+# Hardware parameters: clk frequency and modbus_rtu_slave/modbus_rtu_master
+# settings of your design
+MB_CLK_FREQ = 60000000		# Hz
+MB_BAUD_DIV_DEF = 3125
+MB_BAUD_DIV_OPT1 = 521
+MB_BAUD_DIV_OPT2 = 20
+MB_DE_TIME = 100			# clk periods
+MB_RESPONSE_TIMEOUT = 1.0	# master's response timeout [sec]
+MB_PROCESS_TIME = 0.05		# slave MCU request processing time [sec]
+MB_ACCESS_TIME = 0.002		# host to Avalon bus access latency [sec]
+
+# Status register polling period limits [sec]
+MB_POLL_MIN = 0.0001
+MB_POLL_MAX = 0.01
+
+MB_CRC_INIT = 0xFFFF
+MB_CRC_POLY = 0xA001	# reflected 0x8005
+
 
 
 def incr_err_count():
@@ -53,104 +86,667 @@ setattr(incr_err_count, 'count', 0)
 
 
 
-def wait_mb_master_status(status):
-	mb_bsp.wait_master_status(status)  # 'FSM status' or 'PDU status'
-	if mb_bsp.alarm_cb.status_timeout == 1:
-		print('*** Test FAILED: ', status , ' timeout ***') 
-		mb_bsp.alarm_cb.status_timeout = 0
-		incr_err_count()
+def reset_err_count():
+	incr_err_count.count = 0
 
 
+
+# Timing
+
+def baud_divisor(baud_code):
+	if baud_code == 0:
+		return MB_BAUD_DIV_DEF << 1
+	elif baud_code == 2 and MB_BAUD_DIV_OPT1 < MB_BAUD_DIV_DEF:
+		return MB_BAUD_DIV_OPT1
+	elif baud_code == 3 and MB_BAUD_DIV_OPT2 < MB_BAUD_DIV_DEF:
+		return MB_BAUD_DIV_OPT2
 	
-def config_modbus(modbus_role, slave_addr, pdu, config_val):
-	wait_mb_master_status('FSM status')
+	return MB_BAUD_DIV_DEF
 
-	if modbus_role == 'Master':
-		mb_bsp.write_mb_master_cs(CONFIG_REG, config_val)		# Set configuration
-		mb_bsp.write_mb_master_cs(SLAVE_ADDR_REG, slave_addr)	# Set slave address
-		mb_bsp.write_mb_master_cs(PDU_SIZE_REG, len(pdu))		# Set request PDU size
-			
-		mb_bsp.write_mb_master_pdu(pdu)						# Set request PDU
-	else:
-		mb_bsp.write_mb_slave_cs(CONFIG_REG, config_val)		# Set configuration
-		mb_bsp.write_mb_slave_cs(SLAVE_ADDR_REG, slave_addr)	# Set slave address
+
+
+def bit_time(config_val):
+	return baud_divisor(config_val & 0x3) / MB_CLK_FREQ
+
+
+
+def char_bits(config_val):
+	# Start bit, 8 data bits, parity bit and stop bits
+	return 9 + ((config_val >> 8) & 0x1) + ((config_val >> 10) & 0x1) + 1
+
+
+
+def char_time(config_val):
+	return char_bits(config_val) * bit_time(config_val)
+
+
+
+def frame_time(config_val, pdu_size):
+	# Slave address + PDU + CRC [sec]
+	return (pdu_size + 3) * char_time(config_val)
+
+
+
+def t15_time(config_val):
+	# Inter-character timeout as modbus_rtu_slave counts it: 12 bits/char
+	# of BAUD_DIV_DEF rate, doubled for 9600 baud code only
+	t15 = MB_BAUD_DIV_DEF * 18
+	if config_val & 0x3 == 0:
+		t15 <<= 1
+	
+	return t15 / MB_CLK_FREQ
 
 
 
-def generate_0x03_pdu(addr, regnum):
-	pdu = list()
-	ref_pdu = list()
-	pdu.append(0x3)
-	ref_pdu.append(0x3)
+def t35_time(config_val):
+	# Inter-frame silence, same rules as t1.5
+	t35 = MB_BAUD_DIV_DEF * 42
+	if config_val & 0x3 == 0:
+		t35 <<= 1
 	
-	addr_h = (addr & 0xff00) >> 8
-	pdu.append(addr_h)
-	addr_l = (addr & 0xff)
-	pdu.append(addr_l)
+	return t35 / MB_CLK_FREQ
 
-	regnum_h = (regnum & 0xff00) >> 8
-	pdu.append(regnum_h)
-	regnum_l = regnum & 0xff
-	pdu.append(regnum_l)
-	bytecount = regnum << 1
-	ref_pdu.append(bytecount)
-	for i in range(bytecount):
-		ref_pdu.append(0)	
+
+
+def de_time():
+	# Driver enable to the first transmitted bit
+	return MB_DE_TIME / MB_CLK_FREQ
+
+
+
+def frame_end_time(config_val, pdu_size):
+	# Frame start to the frame end detection by receiver (t3.5 of silence)
+	return frame_time(config_val, pdu_size) + t35_time(config_val)
+
+
+
+def turnaround_time(config_val, response_size, process_time=MB_PROCESS_TIME):
+	# Request frame end detection to response frame end on the bus:
+	# slave MCU processing, driver enable and response frame
+	return 	process_time + de_time() + \
+			frame_end_time(config_val, response_size)
+
+
+
+def transaction_time(config_val, request_size, response_size, process_time=MB_PROCESS_TIME):
+	return 	de_time() + frame_end_time(config_val, request_size) + \
+			turnaround_time(config_val, response_size, process_time)
+
+
+
+def status_timeout(modbus_role, status, config_val=None, pdu_size=None, shadow=None):
+	# Deadline for status wait: transaction with the longest response and,
+	# for master FSM, its response timeout. Unknown settings are taken from
+	# the CS registers shadow (cs_shadow by default) or are the slowest ones
+	if shadow is None:
+		shadow = cs_shadow
+	if config_val is None:
+		config_val = shadow[modbus_role][CONFIG_REG]
+		if config_val is None:
+			config_val = 0x500	# 9600 baud code, parity, 2 stop bits
+	if pdu_size is None:
+		pdu_size = shadow[modbus_role][PDU_SIZE_REG]
+		if pdu_size is None:
+			pdu_size = MB_MAX_PDU_SIZE
 	
-	return [pdu, ref_pdu]
+	timeout = 	transaction_time(config_val, pdu_size, MB_MAX_PDU_SIZE) + \
+				MB_ACCESS_TIME
+	if status == 'FSM status':
+		timeout += MB_RESPONSE_TIMEOUT
 	
+	return timeout
+
+
 
+# Bus planning: wire time of planned transactions, utilization, cycle time
+# and headroom for a configuration value, comparison of configurations.
+# Transaction is (fcode, regnum, period [sec] or None - once per cycle)
+
+def request_pdu_size(fcode, regnum):
+	if fcode == FCODE_0x10:
+		return 6 + (regnum << 1)
 	
-def generate_0x06_pdu(addr, regval):
-	pdu = list()
-	pdu.append(0x6)
+	return 5
+
+
 
-	addr_h = (addr & 0xff00) >> 8
-	pdu.append(addr_h)
-	addr_l = (addr & 0xff)
-	pdu.append(addr_l)
+def response_pdu_size(fcode, regnum):
+	if fcode == FCODE_0x3:
+		return 2 + (regnum << 1)
 	
-	regval_h = (regval[0] & 0xff00) >> 8
-	pdu.append(regval_h)
-	regval_l = regval[0] & 0xff
-	pdu.append(regval_l)
+	return 5
+
+
+
+def bus_plan(config_val, transactions, cycle_time=None, process_time=MB_PROCESS_TIME):
+	# Returns per transaction (request time, response time, total time) and
+	# worst-case cycle time (every transaction once), utilization and headroom.
+	# Request/response time: driver enable, frame and t3.5 silence
+	items = list()
+	for fcode, regnum, period in transactions:
+		request = de_time() + frame_end_time(config_val, request_pdu_size(fcode, regnum))
+		response = de_time() + frame_end_time(config_val, response_pdu_size(fcode, regnum))
+		items.append((request, response, request + process_time + response))
 	
-	ref_pdu = pdu.copy()
+	cycle = sum(item[2] for item in items)
+	if cycle_time is None and all(period is not None for fcode, regnum, period in transactions):
+		load = sum(item[2] / period for item, (fcode, regnum, period) in zip(items, transactions))
+	elif cycle_time is not None:
+		load = sum(item[2] / (period or cycle_time) for item, (fcode, regnum, period) in zip(items, transactions))
+	else:
+		load = None		# back-to-back polling: the bus is always busy
 	
-	return [pdu, ref_pdu]	
+	headroom = None if load is None else 1 - load
+	
+	return (items, cycle, load, headroom)
 
 
 
-def generate_0x10_pdu(addr, regnum, regval):
-	pdu = list()
-	pdu.append(0x10)
+def print_bus_plan(config_val, transactions, cycle_time=None, process_time=MB_PROCESS_TIME):
+	items, cycle, load, headroom = bus_plan(config_val, transactions, cycle_time, process_time)
 	
-	addr_h = (addr & 0xff00) >> 8
-	pdu.append(addr_h)
-	addr_l = (addr & 0xff)
-	pdu.append(addr_l)
+	print()
+	print(f'*** Bus plan: config = {config_val:#x}, {MB_CLK_FREQ / baud_divisor(config_val & 0x3):.0f} baud, '
+			f'{char_bits(config_val)} bits/char ***')
+	print(f'{"fcode":>6}{"regnum":>7}{"req ch":>7}{"resp ch":>8}{"req ms":>9}{"resp ms":>9}{"total ms":>10}{"period ms":>11}')
+	for (fcode, regnum, period), (request, response, total) in zip(transactions, items):
+		print(	f'{fcode:>#6x}{regnum:>7}{request_pdu_size(fcode, regnum) + 3:>7}'
+				f'{response_pdu_size(fcode, regnum) + 3:>8}{request * 1e3:>9.3f}{response * 1e3:>9.3f}'
+				f'{total * 1e3:>10.3f}{"cycle" if period is None else f"{period * 1e3:.1f}":>11}')
 	
-	regnum_h = (regnum & 0xff00) >> 8
-	pdu.append(regnum_h)
-	regnum_l = regnum & 0xff
-	pdu.append(regnum_l)
+	print(f'Worst-case cycle: {cycle * 1e3:.3f} ms', end='')
+	if load is not None:
+		print(f'; utilization: {load * 100:.1f} %; headroom: {headroom * 100:.1f} %', end='')
+	print()
+
+
+
+def config_alternatives(config_val):
+	# The same frame format at every baud code and without parity
+	no_parity = config_val & ~0x300
+	config_l = [(config_val & ~0x3) | baud_code for baud_code in range(4)]
+	config_l += [(no_parity & ~0x3) | baud_code for baud_code in range(4) if no_parity != config_val]
 	
-	ref_pdu = pdu.copy()
+	return config_l
+
+
+
+def compare_configs(transactions, config_l, cycle_time=None, process_time=MB_PROCESS_TIME):
+	print()
+	print('*** Configurations comparison ***')
+	print(f'{"config":>8}{"baud":>9}{"bits":>6}{"cycle ms":>11}{"util %":>9}{"headroom %":>12}')
+	for config_val in config_l:
+		items, cycle, load, headroom = bus_plan(config_val, transactions, cycle_time, process_time)
+		print(	f'{config_val:>#8x}{MB_CLK_FREQ / baud_divisor(config_val & 0x3):>9.0f}'
+				f'{char_bits(config_val):>6}{cycle * 1e3:>11.3f}'
+				f'{"-" if load is None else f"{load * 100:.1f}":>9}'
+				f'{"-" if headroom is None else f"{headroom * 100:.1f}":>12}')
+
+
+
+# Status wait
+
+WaitResult = namedtuple('WaitResult', ['ok', 'elapsed', 'polls'])
+
+
+
+def wait_status(modbus_role, status, timeout=None, bsp=None, shadow=None):
+	# Wait until status is set:
+	#	'FSM status' - master FSM is ready,
+	#	'PDU status' - response (master) or request (slave) PDU is received.
+	# Uses bsp.wait_status_event if backend supports status notification,
+	# otherwise polls with period growing from MB_POLL_MIN to MB_POLL_MAX.
+	# bsp - backend module (mb_bsp by default), shadow - its CS registers
+	# shadow for the default timeout (cs_shadow by default)
+	if bsp is None:
+		bsp = mb_bsp
+	if timeout is None:
+		timeout = status_timeout(modbus_role, status, shadow=shadow)
+	clock = bsp.clock
+	start = clock.monotonic()
+	deadline = start + timeout
 	
-	bytecount = regnum_l << 1
-	pdu.append(bytecount)
+	ok = bsp.wait_status_event(modbus_role, status, timeout)
+	if ok is not None:
+		return WaitResult(bool(ok), clock.monotonic() - start, 0)
 	
-	for i in range(regnum_l):
-		regval_h = (regval[i] & 0xff00) >> 8
-		pdu.append(regval_h)
-		regval_l = regval[i] & 0xff
-		pdu.append(regval_l)
+	polls = 0
+	poll = MB_POLL_MIN
+	while True:
+		polls += 1
+		ok = bsp.get_pdu_status(modbus_role, status)
+		now = clock.monotonic()
+		if ok or now >= deadline:
+			return WaitResult(bool(ok), now - start, polls)
 		
-	return [pdu, ref_pdu]
+		clock.sleep(min(poll, deadline - now))
+		poll = min(poll * 2, MB_POLL_MAX)
+
+
+
+def wait_mb_master_status(status):
+	result = wait_status('Master', status)		# 'FSM status' or 'PDU status'
+	if not result.ok:
+		print('*** Test FAILED: ', status , ' timeout ***') 
+		incr_err_count()
+		mb_bsp.dump_trace(status + ' timeout')
+	
+	return result
+
+
+
+def send_request(config_val, request_size):
+	# Start request of master configured by config_modbus and wait while
+	# master FSM is busy; the transaction is recorded with its latency.
+	# Returns 1 if response is received
+	mb_bsp.write_mb_master_cs(CS_REG, 0)
+	result = wait_mb_master_status('FSM status')
+	
+	response_received = mb_bsp.get_pdu_status('Master', 'PDU status')
+	if response_received:
+		print('Response received')
+		response_size = read_cs('Master', PDU_SIZE_REG)
+	else:
+		print('Response isn\'t received')
+		response_size = 0
+	mb_report.transaction(	config_val, request_size, response_size, result.elapsed,
+							int(bool(response_received)), mb_bsp.clock.monotonic())
+	
+	return response_received
+
+
+
+# Write-through shadow copy of CS registers, per role. Holds the values
+# registers latched after writes made by write_cs (None - unknown), so
+# writes of the same value are skipped. PDU size register is write-only
+# for the cache: read returns received PDU size. Invalidate the cache
+# after reset or after CS registers were written bypassing write_cs.
+
+cs_shadow = {'Master': [None] * 4, 'Slave': [None] * 4}
+
+
+
+def invalidate_cs_cache(modbus_role='Both'):
+	for role in cs_shadow:
+		if modbus_role in ('Both', role):
+			cs_shadow[role][:] = [None] * 4
+
+
+
+def cs_latched_value(modbus_role, cs_reg, wdata):
+	# Value the register keeps after write, None if write is ignored
+	wdata &= 0xFFFFFFFF
+	if cs_reg == PDU_SIZE_REG:
+		if MB_MIN_PDU_SIZE <= wdata <= MB_MAX_PDU_SIZE:
+			return wdata
+	elif cs_reg == CONFIG_REG:
+		return wdata & MB_CONFIG_MASK
+	elif cs_reg == SLAVE_ADDR_REG:
+		min_addr = 0 if modbus_role == 'Master' else MB_MIN_SLAVE_ADDR
+		if min_addr <= wdata <= MB_MAX_SLAVE_ADDR:
+			return wdata
+
+	return None
+
+
+
+def write_cs(modbus_role, cs_reg, wdata, commands=None, bsp=None, shadow=None):
+	# Returns 1 if the write is done, 0 if it is skipped.
+	# The write is appended to commands list (mb_bsp.submit_commands) if given.
+	# bsp - backend module (mb_bsp by default), shadow - its CS registers
+	# shadow (cs_shadow by default)
+	if bsp is None:
+		bsp = mb_bsp
+	if shadow is None:
+		shadow = cs_shadow
+	value = cs_latched_value(modbus_role, cs_reg, wdata)
+	shadow = shadow[modbus_role]
+	if value is not None and shadow[cs_reg] == value:
+		write_cs.skipped += 1
+		return 0
+
+	if modbus_role == 'Master':
+		command = ('write_mb_master_cs', cs_reg, wdata)
+	else:
+		command = ('write_mb_slave_cs', cs_reg, wdata)
 	
+	if commands is not None:
+		commands.append(command)
+	elif modbus_role == 'Master':
+		bsp.write_mb_master_cs(cs_reg, wdata)
+	else:
+		bsp.write_mb_slave_cs(cs_reg, wdata)
+
+	if value is not None:
+		shadow[cs_reg] = value
+
+	return 1
+
+setattr(write_cs, 'skipped', 0)
+
+
+
+def read_cs(modbus_role, cs_reg):
+	if cs_reg in (CONFIG_REG, SLAVE_ADDR_REG):
+		value = cs_shadow[modbus_role][cs_reg]
+		if value is not None:
+			return value
+
+	if modbus_role == 'Master':
+		rdata = mb_bsp.read_mb_master_cs(cs_reg)
+	else:
+		rdata = mb_bsp.read_mb_slave_cs(cs_reg)
+
+	if cs_reg in (CONFIG_REG, SLAVE_ADDR_REG):
+		cs_shadow[modbus_role][cs_reg] = rdata
+
+	return rdata
+
+
+
+def config_modbus(modbus_role, slave_addr, pdu, config_val):
+	wait_mb_master_status('FSM status')
+
+	if modbus_role == 'Master':
+		write_cs('Master', CONFIG_REG, config_val)			# Set configuration
+		write_cs('Master', SLAVE_ADDR_REG, slave_addr)		# Set slave address
+		write_cs('Master', PDU_SIZE_REG, len(pdu))			# Set request PDU size
+			
+		mb_bsp.write_mb_master_pdu(pdu)						# Set request PDU
+	else:
+		write_cs('Slave', CONFIG_REG, config_val)			# Set configuration
+		write_cs('Slave', SLAVE_ADDR_REG, slave_addr)		# Set slave address
+
+
+
+def transaction(slave_addr, pdu, config_val, response_size=MB_MAX_PDU_SIZE, expect_timeout=False):
+	# Master's transaction as one mb_bsp command list: configuration, request
+	# PDU, start, status wait and, for unicast, response PDU read.
+	# response_size - expected response PDU size, bounds response read.
+	# expect_timeout - a status wait timeout is expected by the test: it is
+	# not reported, counted or dumped.
+	# Returns status wait result and response PDU (None for broadcast)
+	commands = [('wait_status', 'Master', 'FSM status', status_timeout('Master', 'FSM status'))]
+	write_cs('Master', CONFIG_REG, config_val, commands)
+	write_cs('Master', SLAVE_ADDR_REG, slave_addr, commands)
+	write_cs('Master', PDU_SIZE_REG, len(pdu), commands)
+	commands.append(('write_mb_master_pdu_words', 0, pack_pdu_words(pdu)))
+	commands.append(('write_mb_master_cs', CS_REG, 0))
+	
+	status = 'PDU status' if slave_addr else 'FSM status'
+	commands.append(('wait_status', 'Master', status, status_timeout('Master', status)))
+	wait_index = len(commands) - 1
+	if slave_addr:
+		commands.append(('read_mb_master_cs', PDU_SIZE_REG))
+		commands.append(('read_mb_master_pdu_words', 0, pdu_wordnum(response_size)))
+	
+	results = mb_bsp.submit_commands(commands)
+	
+	for command, result in zip(commands, results):
+		if command[0] == 'wait_status' and not result.ok:
+			if not expect_timeout:
+				print('*** Test FAILED: ', command[2] , ' timeout ***')
+				incr_err_count()
+				mb_bsp.dump_trace(command[2] + ' timeout')
+			# CS writes after a failed wait are skipped, the shadow already
+			# holds their values
+			invalidate_cs_cache('Master')
+			mb_report.transaction(config_val, len(pdu), 0, result.elapsed, 0, mb_bsp.clock.monotonic())
+			return (result, None)
 	
+	result = results[wait_index]
+	if not slave_addr:
+		mb_report.transaction(config_val, len(pdu), 0, result.elapsed, 1, mb_bsp.clock.monotonic())
+		return (result, None)
 	
+	words = results[-1]
+	size = min(results[-2], len(words) << 2)
+	mb_report.transaction(config_val, len(pdu), size, result.elapsed, 1, mb_bsp.clock.monotonic())
+	
+	return (result, unpack_pdu_words(words, size))
+
+
+
+# PDU builders. Request PDU and reference response PDU are written into one
+# buffer and returned as memoryview slices of it, so a buffer must not be
+# reused while the previous PDUs are still in use. 0x06 builder returns
+# bytes and takes no buffer.
+
+MB_PDU_BUF_SIZE = MB_MAX_PDU_SIZE << 1
+
+PDU_HEADER_STRUCT = struct.Struct('>BHH')		# fcode, address, regnum/regval
+PDU_0x10_HEADER_STRUCT = struct.Struct('>BHHB')	# fcode, address, regnum, bytecount
+PDU_0x03_REF_STRUCT = struct.Struct('>BB')		# fcode, bytecount
+REGVAL_STRUCT = [struct.Struct(f'>{i}H') for i in range(MB_MAX_READ_REGNUM + 1)]
+
+ZERO_BYTES = memoryview(bytes(MB_MAX_PDU_SIZE))
+
+
+
+def new_pdu_buffer():
+	return bytearray(MB_PDU_BUF_SIZE)
+
+
+
+def generate_0x03_pdu(addr, regnum, buf=None):
+	if buf is None:
+		buf = new_pdu_buffer()
+	view = memoryview(buf)
+
+	PDU_HEADER_STRUCT.pack_into(buf, 0, FCODE_0x3, addr & 0xFFFF, regnum & 0xFFFF)
+	size = PDU_HEADER_STRUCT.size
+
+	bytecount = (regnum << 1) & 0xFF
+	PDU_0x03_REF_STRUCT.pack_into(buf, size, FCODE_0x3, bytecount)
+	ref_start = size + PDU_0x03_REF_STRUCT.size
+	view[ref_start:ref_start + bytecount] = ZERO_BYTES[:bytecount]
+
+	return [view[:size], view[size:ref_start + bytecount]]
+
+
+
+def generate_0x06_pdu(addr, regval):
+	# Response is an echo of request. The PDU is short enough to be packed
+	# into a new bytes object faster than into a buffer view, so the builder
+	# takes no buffer
+	pdu = PDU_HEADER_STRUCT.pack(FCODE_0x6, addr & 0xFFFF, regval[0] & 0xFFFF)
+
+	return [pdu, pdu]
+
+
+
+def generate_0x10_pdu(addr, regnum, regval, buf=None):
+	if buf is None:
+		buf = new_pdu_buffer()
+	view = memoryview(buf)
+
+	regnum_l = regnum & 0xFF
+	PDU_0x10_HEADER_STRUCT.pack_into(buf, 0, FCODE_0x10, addr & 0xFFFF, regnum & 0xFFFF, (regnum_l << 1) & 0xFF)
+	REGVAL_STRUCT[regnum_l].pack_into(buf, PDU_0x10_HEADER_STRUCT.size, *regval[:regnum_l])
+	size = PDU_0x10_HEADER_STRUCT.size + (regnum_l << 1)
+
+	# Response is the request header without bytecount
+	return [view[:size], view[:PDU_HEADER_STRUCT.size]]
+
+
+
+# Read coalescing: variables (name - register address or (address, regnum))
+# of a slave are read by the least number of 0x03 requests. Requests read over
+# gaps of unused registers up to max_gap registers long, as reading them is
+# cheaper than another request.
+
+ReadRequest = namedtuple('ReadRequest', ['addr', 'regnum', 'variables'])	# variables: [(name, offset, regnum)]
+
+
+
+def read_gap_threshold(config_val):
+	# Unused registers worth reading instead of another request: request
+	# frame, response overhead (address, fcode, bytecount, CRC) and two t3.5
+	# against 2 characters per register
+	request_time = frame_end_time(config_val, 5) + t35_time(config_val) + \
+					5 * char_time(config_val)
+	return int(request_time / (2 * char_time(config_val)))
+
+
+
+def plan_reads(variables, max_gap, max_regnum=MB_MAX_READ_REGNUM):
+	spans = list()
+	for name, var in variables.items():
+		addr, regnum = (var, 1) if isinstance(var, int) else var
+		if not 1 <= regnum <= max_regnum:
+			raise ValueError(f'Variable {name}: {regnum} registers')
+		spans.append((addr, regnum, name))
+	spans.sort()
+	
+	# Greedy: extend request while the next variable fits and the gap is short
+	requests = list()
+	for addr, regnum, name in spans:
+		if requests:
+			request = requests[-1]
+			start = request.addr
+			end = max(start + request.regnum, addr + regnum)
+			if addr - (start + request.regnum) <= max_gap and end - start <= max_regnum:
+				request.variables.append((name, addr - start, regnum))
+				requests[-1] = request._replace(regnum=end - start)
+				continue
+		requests.append(ReadRequest(addr, regnum, [(name, 0, regnum)]))
+	
+	return requests
+
+
+
+def split_read_response(request, response_pdu):
+	# Register values of request's variables from 0x03 response PDU
+	regval = REGVAL_STRUCT[request.regnum].unpack_from(response_pdu, 2)
+	
+	return {name: list(regval[offset:offset + regnum]) for name, offset, regnum in request.variables}
+
+
+
+def read_variables(slave_addr, variables, config_val, max_gap=None):
+	# Returns dict of variables' register values, None if a request failed
+	if max_gap is None:
+		max_gap = read_gap_threshold(config_val)
+	
+	values = dict()
+	for request in plan_reads(variables, max_gap):
+		pdu, ref_pdu = generate_0x03_pdu(request.addr, request.regnum)
+		result, response_pdu = transaction(slave_addr, pdu, config_val, len(ref_pdu))
+		if not result.ok or len(response_pdu) != len(ref_pdu) or response_pdu[0] != FCODE_0x3:
+			return None
+		values.update(split_read_response(request, response_pdu))
+	
+	return values
+
+
+
+# PDU interface: each word holds 4 consequent PDU bytes, the first one in [7 : 0]
+
+PDU_WORD_TYPECODE = 'I' if array('I').itemsize == 4 else 'L'
+
+
+
+def pdu_wordnum(size):
+	return (size + 3) >> 2
+
+
+
+def pack_pdu_words(pdu):
+	size = len(pdu)
+	buf = bytearray(pdu_wordnum(size) << 2)
+	buf[:size] = pdu
+	words = array(PDU_WORD_TYPECODE, buf)
+	if sys.byteorder == 'big':
+		words.byteswap()
+
+	return words
+
+
+
+def unpack_pdu_words(words, size):
+	if sys.byteorder == 'big':
+		words = array(PDU_WORD_TYPECODE, words)
+		words.byteswap()
+
+	return words.tobytes()[:size]
+
+
+
+# Modbus CRC-16
+
+def generate_crc_table():
+	table = list()
+	for i in range(256):
+		crc = i
+		for j in range(8):
+			if crc & 0x1:
+				crc = (crc >> 1) ^ MB_CRC_POLY
+			else:
+				crc >>= 1
+		table.append(crc)
+
+	return tuple(table)
+
+CRC_TABLE = generate_crc_table()
+
+
+
+def crc16_update(crc, data):
+	# Continue CRC calculation with next chunk of frame bytes
+	table = CRC_TABLE
+	for byte in data:
+		crc = (crc >> 8) ^ table[(crc ^ byte) & 0xFF]
+
+	return crc
+
+
+
+def crc16(data):
+	return crc16_update(MB_CRC_INIT, data)
+
+
+
+def frame_crc(slave_addr, pdu):
+	# CRC of RTU frame: slave address + PDU. Low byte is sent first
+	return crc16_update(crc16_update(MB_CRC_INIT, (slave_addr,)), pdu)
+
+
+
+def generate_fake_crc(crc):
+	# Random CRC not equal to crc
+	return (crc + randrange(1, 65536)) & 0xFFFF
+
+
+
+def crc16_batch(frames):
+	# CRCs of many frames at once. frames is a list of byte sequences
+	# or 2D uint8 array (one frame per row)
+	if np is None:
+		return [crc16(frame) for frame in frames]
+
+	if isinstance(frames, np.ndarray):
+		data = frames.astype(np.uint8, copy=False)
+		size = np.full(data.shape[0], data.shape[1])
+	else:
+		size = np.array([len(frame) for frame in frames], dtype=np.intp)
+		data = np.zeros((len(frames), size.max(initial=0)), dtype=np.uint8)
+		for i, frame in enumerate(frames):
+			data[i, :size[i]] = np.frombuffer(bytes(frame), dtype=np.uint8)
+
+	table = np.array(CRC_TABLE, dtype=np.uint16)
+	crc = np.full(data.shape[0], MB_CRC_INIT, dtype=np.uint16)
+	for i in range(data.shape[1]):
+		next_crc = (crc >> 8) ^ table[(crc ^ data[:, i]) & 0xFF]
+		crc = np.where(size > i, next_crc, crc)
+
+	return crc.tolist()
+
+
+
 def print_test_result(result_ok):
+	test = mb_report.test
+	mb_report.end(result_ok, timeouts=incr_err_count.count)
+	
 	if result_ok:
 		msg = '\tTest Successful'
 	else:
@@ -161,73 +757,124 @@ def print_test_result(result_ok):
 	print(msg)
 	print('***************************')
 	print()
+	
+	if not result_ok:
+		mb_bsp.dump_trace('Test FAILED', test)
+	
+	mb_profile.print_summary()
 		
 		
 
-def get_total_error_count(modbus_role):
-	count = 0
-	error_tuple = mb_bsp.get_error_count()
-	if modbus_role == 'Both':
-		for err_list in error_tuple:
-			for i in err_list:
-				count += i
-	elif modbus_role == 'Master':
-		for i in error_tuple[0]:
-			count += i
-	elif modbus_role == 'Slave':
-		for i in error_tuple[1]:
-			count += i
+# Error counters snapshot: master's parity, start bit, stop bit, address and
+# crc error counts followed by slave's ones
+
+ERROR_TYPES = ('parity', 'start bit', 'stop bit', 'address', 'crc')
+ERROR_FIELDS = ('parity', 'start_bit', 'stop_bit', 'addr', 'crc')
+ERROR_ROLES = ('Master', 'Slave')
+
+
+
+class ErrorSnapshot:
+	__slots__ = ('count',)
+
+	def __init__(self, error_tuple=None):
+		if error_tuple is None:
+			self.count = array('L', bytes(array('L').itemsize * 10))
+		else:
+			self.count = array('L', error_tuple[0])
+			self.count.extend(error_tuple[1])
+
+
+	def delta(self, prev):
+		# Counts since prev snapshot, counters wrap around at 32 bits
+		snapshot = ErrorSnapshot()
+		for i in range(10):
+			snapshot.count[i] = (self.count[i] - prev.count[i]) & 0xFFFFFFFF
+		return snapshot
+
+
+	def total(self, modbus_role):
+		if modbus_role == 'Master':
+			return sum(self.count[:5])
+		elif modbus_role == 'Slave':
+			return sum(self.count[5:])
+		return sum(self.count)
+
+
+	def single(self, modbus_role, error_type):
+		offset = 0 if modbus_role == 'Master' else 5
+		return self.count[offset + ERROR_TYPES.index(error_type)]
+
+
+	def as_dict(self):
+		return {name: self.count[i] for i, name in enumerate(ERROR_NAMES)}
+
+# Named fields: master_parity, ..., slave_crc
+ERROR_NAMES = tuple(f'{role.lower()}_{field}' for role in ERROR_ROLES for field in ERROR_FIELDS)
+for i, name in enumerate(ERROR_NAMES):
+	setattr(ErrorSnapshot, name, property(lambda self, i=i: self.count[i]))
+
+
+
+def get_error_snapshot():
+	return ErrorSnapshot(mb_bsp.get_error_count())
+
+
+
+def get_error_delta():
+	# Error counts since previous call: one readback per step, no need
+	# to reset error counters between steps
+	snapshot = get_error_snapshot()
+	delta = snapshot.delta(get_error_delta.prev)
+	get_error_delta.prev = snapshot
+	return delta
+
+setattr(get_error_delta, 'prev', ErrorSnapshot())
+
+
+
+def get_total_error_count(modbus_role, snapshot=None):
+	if snapshot is None:
+		snapshot = get_error_snapshot()
 		
-	return count
+	return snapshot.total(modbus_role)
 	
 
 
-def get_single_error_count(modbus_role, error_type):
-	error_tuple = mb_bsp.get_error_count()
-	count = 0
-	if modbus_role == 'Master':
-		if error_type == 'parity':
-			count = error_tuple[0][0]
-		elif error_type == 'start bit':
-			count = error_tuple[0][1]
-		elif error_type == 'stop bit':
-			count = error_tuple[0][2]
-		elif error_type == 'address':
-			count = error_tuple[0][3]
-		elif error_type == 'crc':
-			count = error_tuple[0][4]
-	elif modbus_role == 'Slave':
-		if error_type == 'parity':
-			count = error_tuple[1][0]
-		elif error_type == 'start bit':
-			count = error_tuple[1][1]
-		elif error_type == 'stop bit':
-			count = error_tuple[1][2]
-		elif error_type == 'address':
-			count = error_tuple[1][3]
-		elif error_type == 'crc':
-			count = error_tuple[1][4]
-	
-	return count
+def get_single_error_count(modbus_role, error_type, snapshot=None):
+	if snapshot is None:
+		snapshot = get_error_snapshot()
+	
+	return snapshot.single(modbus_role, error_type)
 		
 	
 	
-def print_error_count():	
-	error_tuple = mb_bsp.get_error_count()
+def print_error_count(snapshot=None):	
+	if snapshot is None:
+		snapshot = get_error_snapshot()
 
 	print()	
-	print('master_parity_err_count = ', error_tuple[0][0])
-	print('master_start_bit_err_count = ', error_tuple[0][1])
-	print('master_stop_bit_err_count = ', error_tuple[0][2])
-	print('master_addr_err_count = ', error_tuple[0][3])
-	print('master_crc_err_count = ', error_tuple[0][4])
-
-	print('slave_parity_err_count = ', error_tuple[1][0])
-	print('slave_start_bit_err_count = ', error_tuple[1][1])
-	print('slave_stop_bit_err_count = ', error_tuple[1][2])
-	print('slave_addr_err_count = ', error_tuple[1][3])
-	print('slave_crc_err_count = ', error_tuple[1][4])
+	for role in ERROR_ROLES:
+		for field in ERROR_FIELDS:
+			name = f'{role.lower()}_{field}'
+			print(f'{name}_err_count = ', getattr(snapshot, name))
 	
 	print('--------------------------------')
 	print()	
-	
\ No newline at end of file
+	
+
+
+
+# Profiled helpers (mb_profile.py, MB_PROFILE=1)
+
+mb_profile.install(globals(), [	'wait_status',
+								'wait_mb_master_status',
+								'write_cs',
+								'read_cs',
+								'send_request',
+								'transaction',
+								'read_variables',
+								'get_error_snapshot',
+								'get_error_delta',
+								'print_error_count'])
+mb_profile.install(globals(), ['config_modbus'], mb_profile.config_size)